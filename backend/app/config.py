@@ -11,8 +11,10 @@ load_dotenv()
 
 # --- Paths ---
 BASE_DIR = Path(__file__).resolve().parent.parent
-UPLOAD_DIR = BASE_DIR / "uploads"
-VECTOR_STORE_DIR = BASE_DIR / "vector_store"
+# Root for stored data; give each node its own when running several on one machine
+DATA_DIR = Path(os.getenv("DATA_DIR", str(BASE_DIR))).resolve()
+UPLOAD_DIR = DATA_DIR / "uploads"
+VECTOR_STORE_DIR = DATA_DIR / "vector_store"
 
 UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
 VECTOR_STORE_DIR.mkdir(parents=True, exist_ok=True)
@@ -25,14 +27,80 @@ EMBEDDING_MODEL_ID = "BAAI/bge-small-en-v1.5"
 # --- Encryption ---
 AES_SECRET_KEY = os.getenv("AES_SECRET_KEY", "")
 
+# --- Multi-process serving ---
+# Enable when running several workers (e.g. `uvicorn app.main:app --workers 4`).
+# Workers then share a generated AES key file and memory-mapped FAISS indexes.
+MULTI_PROCESS = os.getenv("MULTI_PROCESS", "").lower() in ("1", "true", "yes")
+SHARED_STATE_DIR = DATA_DIR / "shared_state"
+SHARED_KEY_PATH = SHARED_STATE_DIR / "aes_key.b64"
+INDEX_CACHE_SIZE = int(os.getenv("INDEX_CACHE_SIZE", "64"))
+
+# --- Sharded cluster ---
+# Comma-separated base URLs of all nodes; empty means single-node mode.
+# Documents are placed on nodes by consistent hashing of document_id.
+CLUSTER_NODES = [n.strip().rstrip("/") for n in os.getenv("CLUSTER_NODES", "").split(",") if n.strip()]
+CLUSTER_SELF_URL = os.getenv("CLUSTER_SELF_URL", "").strip().rstrip("/")
+CLUSTER_TOKEN = os.getenv("CLUSTER_TOKEN", "")  # Shared secret for node-to-node requests
+CLUSTER_VIRTUAL_NODES = 64
+CLUSTER_REQUEST_TIMEOUT = 120.0
+
+# --- Startup / warmup ---
+# Services initialize lazily; warmup preloads recent indexes and opens upstream connections
+WARMUP_ON_STARTUP = os.getenv("WARMUP_ON_STARTUP", "true").lower() in ("1", "true", "yes")
+WARMUP_DOCUMENTS = int(os.getenv("WARMUP_DOCUMENTS", "8"))
+HF_INFERENCE_URL = "https://router.huggingface.co"
+
+# --- Upstream scheduling (LLM + embedding calls) ---
+# Limits and queues are per process: with N workers (or N cluster nodes) up to N times
+# UPSTREAM_MAX_CONCURRENCY calls can be in flight, so divide the account limit by N.
+UPSTREAM_INITIAL_CONCURRENCY = int(os.getenv("UPSTREAM_INITIAL_CONCURRENCY", "4"))
+UPSTREAM_MIN_CONCURRENCY = 1
+UPSTREAM_MAX_CONCURRENCY = int(os.getenv("UPSTREAM_MAX_CONCURRENCY", "16"))
+UPSTREAM_TARGET_LATENCY = 15.0  # seconds; slower calls shrink the concurrency limit
+# Max queued calls and max queue wait (seconds) per priority class
+UPSTREAM_QUEUE_LIMITS = {"interactive": 64, "upload": 32, "background": 16}
+UPSTREAM_QUEUE_DEADLINES = {"interactive": 30.0, "upload": 120.0, "background": 60.0}
+
 # --- RAG Thresholds ---
 CONFIDENCE_THRESHOLD = 0.45
 SIMILARITY_THRESHOLD = 0.35
 TOP_K_CHUNKS = 5
+# A batch asks up to BATCH_PROMPT_QUESTIONS questions per LLM call (one combined prompt
+# answered with a JSON array) and keeps at most BATCH_LLM_CONCURRENCY calls queued or
+# running, so its calls wait in the interactive queue no longer than a single /ask;
+# 20 questions then take 4 LLM calls, 2 round-trips.
+MAX_BATCH_QUESTIONS = 20
+BATCH_PROMPT_QUESTIONS = 5
+BATCH_LLM_CONCURRENCY = 2
+EXTRACTIVE_CONFIDENCE_THRESHOLD = 0.85  # Direct field lookups at or above this skip the LLM
+EXTRACTIVE_MIN_SIMILARITY = 0.55  # ...and only when the best chunk is at least this similar
+
+# --- Vector compression ---
+# "none" (float32 IndexFlatIP), "fp16" / "int8" (scalar quantization) or "pq" (product quantization)
+VECTOR_COMPRESSION = os.getenv("VECTOR_COMPRESSION", "none").lower()
+# Keep vectors (as fp16) beside int8/PQ indexes and re-rank the top candidates with them.
+# Costs 50% of the float32 size on top of the codes: int8 + re-rank ~75%, pq + re-rank ~60%.
+VECTOR_RERANK = os.getenv("VECTOR_RERANK", "true").lower() in ("1", "true", "yes")
+RERANK_CANDIDATES_FACTOR = 4
+PQ_MIN_VECTORS = 1024  # Smaller documents fall back to int8 (too few vectors to train PQ)
+PQ_SUBQUANTIZERS = 48
 
 # --- Chunking ---
 CHUNK_SIZE = 1000
 CHUNK_OVERLAP = 200
 
+# --- Ingestion pipeline ---
+# Return from upload once the first batch is searchable; finish indexing in the background
+PROGRESSIVE_INGESTION = os.getenv("PROGRESSIVE_INGESTION", "true").lower() in ("1", "true", "yes")
+EMBED_BATCH_SIZE = 32
+INGEST_QUEUE_SIZE = 4
+# Background ingestion retries an overloaded upstream this many times / this long, then fails
+INGEST_MAX_RETRIES = 10
+INGEST_RETRY_BUDGET = 600.0  # seconds
+# A running pipeline touches a heartbeat file this often; "indexing" documents whose
+# heartbeat is older than INGEST_STALE_AFTER (e.g. after a restart) are marked "failed"
+INGEST_HEARTBEAT_INTERVAL = 10.0
+INGEST_STALE_AFTER = 60.0
+
 # --- Allowed file types ---
 ALLOWED_EXTENSIONS = {".pdf", ".docx", ".txt"}
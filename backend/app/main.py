@@ -2,15 +2,41 @@
 Ultra Doc-Intelligence — FastAPI Application Entry Point.
 """
 
+import asyncio
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 
+from app.config import WARMUP_ON_STARTUP
 from app.routers.documents import router as documents_router
+from app.routers.cluster import router as cluster_router
+from app.services.cluster import validate_config as validate_cluster_config
+from app.services.warmup import warm_up, mark_ready, get_warmup_status
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    validate_cluster_config()
+
+    # Warm up in the background so the server accepts traffic immediately;
+    # /ready reports when caches and upstream connections are hot.
+    warmup_task = None
+    if WARMUP_ON_STARTUP:
+        warmup_task = asyncio.create_task(asyncio.to_thread(warm_up))
+    else:
+        mark_ready()
+    yield
+    if warmup_task is not None and not warmup_task.done():
+        warmup_task.cancel()
+
 
 app = FastAPI(
     title="Ultra Doc-Intelligence API",
     description="AI-powered logistics document analysis with RAG, guardrails, and structured extraction.",
     version="1.0.0",
+    lifespan=lifespan,
 )
 
 # CORS — allow React dev server
@@ -24,6 +50,7 @@ app.add_middleware(
 
 # Include routers
 app.include_router(documents_router, prefix="/api", tags=["Documents"])
+app.include_router(cluster_router, prefix="/api/cluster", tags=["Cluster"])
 
 
 @app.get("/")
@@ -34,7 +61,10 @@ async def root():
         "endpoints": {
             "upload": "POST /api/upload",
             "ask": "POST /api/ask",
+            "ask_batch": "POST /api/ask/batch",
             "extract": "POST /api/extract",
+            "search": "POST /api/search",
+            "metrics": "GET /api/metrics",
             "docs": "GET /docs",
         },
     }
@@ -43,3 +73,12 @@ async def root():
 @app.get("/health")
 async def health_check():
     return {"status": "healthy"}
+
+
+@app.get("/ready")
+async def readiness_check():
+    """Readiness probe: 200 once warmup has finished, 503 while still warming up."""
+    status = get_warmup_status()
+    if not status["ready"]:
+        return JSONResponse(status_code=503, content={"status": "warming_up", **status})
+    return {"status": "ready", **status}
@@ -12,6 +12,8 @@ class UploadResponse(BaseModel):
     num_chunks: int
     message: str
     suggested_questions: list[str] = []
+    status: str = "ready"  # "indexing" while the rest of the document is still being indexed
+    deduplicated: bool = False  # True when identical content was already processed (its index is reused)
 
 
 class AskRequest(BaseModel):
@@ -28,11 +30,18 @@ class AskResponse(BaseModel):
     answer: str
     sources: list[SourceChunk]
     confidence: float
-    guardrail_status: str  # "grounded", "low_confidence", "no_context", "refused"
+    guardrail_status: str  # "grounded", "extracted", "low_confidence", "no_context", "refused", "error" (batch only)
+    partial: bool = False  # True if the document was not fully indexed when answering
+
+
+class BatchAskRequest(BaseModel):
+    document_id: str
+    questions: list[str]
 
 
 class ExtractRequest(BaseModel):
     document_id: str
+    refresh: bool = False  # Ignore the stored result and re-run extraction
 
 
 class ShipmentData(BaseModel):
@@ -53,3 +62,32 @@ class ExtractResponse(BaseModel):
     document_id: str
     data: ShipmentData
     confidence: float
+    cached: bool = False  # True if served from the stored extraction
+
+
+class DocumentStatusResponse(BaseModel):
+    document_id: str
+    status: str  # "indexing", "ready", "failed"
+    num_chunks: int
+
+
+class SearchRequest(BaseModel):
+    query: str
+    top_k: int = 5
+
+
+class SearchHit(BaseModel):
+    document_id: str
+    filename: str
+    text: str
+    score: float
+
+
+class SearchResponse(BaseModel):
+    results: list[SearchHit]
+    failed_nodes: list[str] = []  # Cluster nodes that did not answer; results may be incomplete
+
+
+class ClusterSearchRequest(BaseModel):
+    query_embedding: list[float]
+    top_k: int = 5
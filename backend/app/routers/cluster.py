@@ -0,0 +1,57 @@
+"""
+Internal API used between nodes of a sharded cluster: per-node search for
+scatter-gather, and document import when rebalancing. Requires the cluster token.
+"""
+
+import asyncio
+
+from fastapi import APIRouter, Depends, HTTPException, Request
+
+from app.models.schemas import ClusterSearchRequest
+from app.services import cluster
+from app.services.document_processor import (
+    import_document_bundle,
+    list_local_document_ids,
+    search_all_documents,
+)
+
+router = APIRouter()
+
+
+def _require_cluster_token(http_request: Request):
+    if not cluster.is_internal_request(http_request.headers):
+        raise HTTPException(status_code=403, detail="Cluster token required.")
+
+
+@router.get("", dependencies=[Depends(_require_cluster_token)])
+async def cluster_info():
+    """Ring membership and the documents stored on this node, with their current owner."""
+    return {
+        **cluster.get_cluster_info(),
+        "documents": [
+            {"document_id": doc_id, "owner": cluster.owner_of(doc_id) if cluster.is_enabled() else None}
+            for doc_id in list_local_document_ids()
+        ],
+    }
+
+
+@router.post("/search", dependencies=[Depends(_require_cluster_token)])
+async def search_local_documents(request: ClusterSearchRequest):
+    """Search this node's documents with a query embedded by the coordinating node."""
+    import numpy as np
+    query_embedding = np.asarray(request.query_embedding, dtype=np.float32)
+    results = await asyncio.to_thread(search_all_documents, query_embedding, request.top_k)
+    return {"results": results}
+
+
+@router.put("/documents/{document_id}", status_code=201, dependencies=[Depends(_require_cluster_token)])
+async def import_document(document_id: str, http_request: Request):
+    """Store a document bundle exported by another node (used by rebalancing)."""
+    bundle = await http_request.body()
+    try:
+        await asyncio.to_thread(import_document_bundle, document_id, bundle)
+    except FileExistsError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"document_id": document_id, "imported": True}
@@ -1,34 +1,99 @@
 """
-API router for document operations: upload, ask, extract.
+API router for document operations: upload, ask, batch ask, extract, search, metrics.
 """
 
-from fastapi import APIRouter, UploadFile, File, HTTPException
+from typing import Optional
+
+from fastapi import APIRouter, UploadFile, File, HTTPException, Request, Response
 
 from app.models.schemas import (
     AskRequest,
     AskResponse,
+    BatchAskRequest,
+    DocumentStatusResponse,
     ExtractRequest,
     ExtractResponse,
+    SearchRequest,
+    SearchResponse,
     ShipmentData,
     SourceChunk,
     UploadResponse,
 )
-from app.services.document_processor import process_document, document_exists
-from app.services.rag_service import ask_question, generate_suggested_questions
+from app.services.document_processor import (
+    process_document,
+    document_exists,
+    get_document_status,
+    get_document_info,
+    delete_document,
+    embed_queries,
+)
+from app.services.rag_service import (
+    ask_question,
+    ask_questions_batch,
+    generate_suggested_questions,
+)
 from app.services.extraction_service import extract_shipment_data
-from app.config import ALLOWED_EXTENSIONS
+from app.services.coalescing import coalesce, get_coalescing_stats
+from app.services.scheduler import Priority, UpstreamOverloaded, get_scheduler_stats, run_upstream
+from app.services import cluster
+from app.config import ALLOWED_EXTENSIONS, MAX_BATCH_QUESTIONS
 
 import os
+import uuid
 
 router = APIRouter()
 
 
+def _overloaded_error(e: UpstreamOverloaded) -> HTTPException:
+    """Translate scheduler backpressure into 503/429 with a Retry-After hint."""
+    return HTTPException(
+        status_code=e.status_code,
+        detail=str(e),
+        headers={"Retry-After": str(e.retry_after)},
+    )
+
+
+async def _route_to_owner(http_request: Request, document_id: str) -> Optional[Response]:
+    """
+    In a sharded cluster, proxy a request for a document stored on another node
+    to that node and return its response. None means: handle it here.
+    """
+    if cluster.is_local(document_id) or http_request.headers.get(cluster.FORWARDED_HEADER):
+        return None
+
+    try:
+        upstream = await cluster.forward(
+            cluster.owner_of(document_id),
+            http_request.method,
+            http_request.url.path,
+            params=http_request.query_params,
+            content=await http_request.body(),
+            headers={"Content-Type": http_request.headers.get("content-type", "application/json")},
+        )
+    except cluster.ShardUnavailable as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
+    return _proxy_response(upstream)
+
+
+def _proxy_response(upstream) -> Response:
+    headers = {}
+    if "retry-after" in upstream.headers:
+        headers["Retry-After"] = upstream.headers["retry-after"]
+    return Response(
+        content=upstream.content,
+        status_code=upstream.status_code,
+        media_type=upstream.headers.get("content-type"),
+        headers=headers,
+    )
+
+
 @router.post("/upload", response_model=UploadResponse)
-async def upload_document(file: UploadFile = File(...)):
+async def upload_document(http_request: Request, file: UploadFile = File(...)):
     """
     Upload a logistics document (PDF, DOCX, or TXT).
     Parses, chunks, embeds, and stores in FAISS vector index.
     File is encrypted at rest with AES-256-GCM.
+    In a sharded cluster, the document is stored on the node owning its new id.
     """
     # Validate file type
     filename = file.filename or "unknown"
@@ -44,8 +109,34 @@ async def upload_document(file: UploadFile = File(...)):
     if not file_bytes:
         raise HTTPException(status_code=400, detail="Empty file uploaded.")
 
+    # Pick the id up front so the upload can be placed on its shard
+    document_id = None
+    if cluster.is_internal_request(http_request.headers):
+        document_id = http_request.headers.get(cluster.DOCUMENT_ID_HEADER)
+        if document_id is not None:
+            try:
+                document_id = str(uuid.UUID(document_id))
+            except ValueError:
+                raise HTTPException(status_code=400, detail="Invalid document id header.")
+    elif cluster.is_enabled():
+        document_id = str(uuid.uuid4())
+        if not cluster.is_local(document_id):
+            try:
+                upstream = await cluster.forward(
+                    cluster.owner_of(document_id),
+                    "POST",
+                    http_request.url.path,
+                    files={"file": (filename, file_bytes, file.content_type or "application/octet-stream")},
+                    headers={cluster.DOCUMENT_ID_HEADER: document_id},
+                )
+            except cluster.ShardUnavailable as e:
+                raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
+            return _proxy_response(upstream)
+
     try:
-        result = await process_document(file_bytes, filename)
+        result = await process_document(file_bytes, filename, document_id)
+    except UpstreamOverloaded as e:
+        raise _overloaded_error(e)
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
@@ -55,23 +146,90 @@ async def upload_document(file: UploadFile = File(...)):
         )
 
     # Generate suggested questions
-    questions = generate_suggested_questions(result["document_id"])
+    questions = await generate_suggested_questions(result["document_id"])
+
+    if result["deduplicated"]:
+        message = (
+            f"Identical document already processed. Reusing its index "
+            f"({result['num_chunks']} chunks)."
+        )
+    elif result["status"] == "indexing":
+        message = (
+            f"Document uploaded. {result['num_chunks']} chunks indexed so far; "
+            "you can ask questions while the rest is processed."
+        )
+    else:
+        message = f"Document uploaded and processed successfully. {result['num_chunks']} chunks created."
 
     return UploadResponse(
         document_id=result["document_id"],
         filename=result["filename"],
         num_chunks=result["num_chunks"],
-        message=f"Document uploaded and processed successfully. {result['num_chunks']} chunks created.",
+        message=message,
         suggested_questions=questions,
+        status=result["status"],
+        deduplicated=result["deduplicated"],
+    )
+
+
+@router.get("/documents/{document_id}/status", response_model=DocumentStatusResponse)
+async def document_status(document_id: str, http_request: Request):
+    """
+    Ingestion status of a document. Documents in "indexing" state can already
+    be queried; their answers are marked as partial.
+    """
+    proxied = await _route_to_owner(http_request, document_id)
+    if proxied is not None:
+        return proxied
+
+    if not document_exists(document_id):
+        raise HTTPException(
+            status_code=404,
+            detail=f"Document '{document_id}' not found. Please upload a document first.",
+        )
+
+    info = get_document_info(document_id)
+    return DocumentStatusResponse(
+        document_id=document_id,
+        status=info["status"],
+        num_chunks=info["num_chunks"],
     )
 
 
+@router.delete("/documents/{document_id}")
+async def remove_document(document_id: str, http_request: Request):
+    """
+    Delete a document. Storage shared with duplicate uploads of the same file
+    is freed when the last document referencing it is deleted.
+    """
+    proxied = await _route_to_owner(http_request, document_id)
+    if proxied is not None:
+        return proxied
+
+    if document_exists(document_id) and get_document_status(document_id) == "indexing":
+        raise HTTPException(
+            status_code=409,
+            detail="Document is still being indexed. Please retry deletion shortly.",
+        )
+
+    if not delete_document(document_id):
+        raise HTTPException(
+            status_code=404,
+            detail=f"Document '{document_id}' not found.",
+        )
+    return {"document_id": document_id, "deleted": True}
+
+
 @router.post("/ask", response_model=AskResponse)
-async def ask_about_document(request: AskRequest):
+async def ask_about_document(request: AskRequest, http_request: Request):
     """
     Ask a natural language question about an uploaded document.
     Uses RAG with guardrails and returns answer + sources + confidence.
     """
+    proxied = await _route_to_owner(http_request, request.document_id)
+    if proxied is not None:
+        return proxied
+
     if not document_exists(request.document_id):
         raise HTTPException(
             status_code=404,
@@ -81,14 +239,72 @@ async def ask_about_document(request: AskRequest):
     if not request.question.strip():
         raise HTTPException(status_code=400, detail="Question cannot be empty.")
 
+    # Checked before retrieval, so an answer is never marked complete when it wasn't
+    partial = get_document_status(request.document_id) != "ready"
+
     try:
-        result = await ask_question(request.document_id, request.question)
+        result = await coalesce(
+            "ask",
+            request.document_id,
+            request.question,
+            lambda: ask_question(request.document_id, request.question),
+        )
+    except UpstreamOverloaded as e:
+        raise _overloaded_error(e)
     except Exception as e:
         raise HTTPException(
             status_code=500,
             detail=f"Error processing question: {str(e)}",
         )
 
+    return _to_ask_response(result, partial)
+
+
+@router.post("/ask/batch", response_model=list[AskResponse])
+async def ask_batch_about_document(request: BatchAskRequest, http_request: Request):
+    """
+    Ask several questions about one document in a single request.
+    Questions share one embedding call and one batched vector search;
+    answers are returned in the same order as the questions. A question that
+    fails gets guardrail_status "error" instead of failing the whole batch.
+    """
+    proxied = await _route_to_owner(http_request, request.document_id)
+    if proxied is not None:
+        return proxied
+
+    if not document_exists(request.document_id):
+        raise HTTPException(
+            status_code=404,
+            detail=f"Document '{request.document_id}' not found. Please upload a document first.",
+        )
+
+    if not request.questions:
+        raise HTTPException(status_code=400, detail="At least one question is required.")
+    if len(request.questions) > MAX_BATCH_QUESTIONS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Too many questions. At most {MAX_BATCH_QUESTIONS} per batch.",
+        )
+    if any(not q.strip() for q in request.questions):
+        raise HTTPException(status_code=400, detail="Questions cannot be empty.")
+
+    partial = get_document_status(request.document_id) != "ready"
+
+    try:
+        results = await ask_questions_batch(request.document_id, request.questions)
+    except UpstreamOverloaded as e:
+        raise _overloaded_error(e)
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error processing questions: {str(e)}",
+        )
+
+    return [_to_ask_response(result, partial) for result in results]
+
+
+def _to_ask_response(result: dict, partial: bool = False) -> AskResponse:
+    """Convert a RAG result dict into the API response model."""
     sources = [
         SourceChunk(text=s["text"], similarity_score=round(s["similarity_score"], 3))
         for s in result["sources"]
@@ -99,23 +315,43 @@ async def ask_about_document(request: AskRequest):
         sources=sources,
         confidence=result["confidence"],
         guardrail_status=result["guardrail_status"],
+        partial=partial,
     )
 
 
 @router.post("/extract", response_model=ExtractResponse)
-async def extract_structured_data(request: ExtractRequest):
+async def extract_structured_data(request: ExtractRequest, http_request: Request):
     """
     Extract structured shipment data from an uploaded document.
-    Returns JSON with 11 fields (null if not found).
+    Returns JSON with 11 fields (null if not found). Results are stored and
+    reused on repeat calls; set `refresh` to re-run the extraction.
     """
+    proxied = await _route_to_owner(http_request, request.document_id)
+    if proxied is not None:
+        return proxied
+
     if not document_exists(request.document_id):
         raise HTTPException(
             status_code=404,
             detail=f"Document '{request.document_id}' not found. Please upload a document first.",
         )
 
+    # Extraction reads the whole document, so it waits for ingestion to finish
+    if get_document_status(request.document_id) == "indexing":
+        raise HTTPException(
+            status_code=409,
+            detail="Document is still being indexed. Please retry extraction shortly.",
+        )
+
     try:
-        result = await extract_shipment_data(request.document_id)
+        result = await coalesce(
+            "extract",
+            request.document_id,
+            "refresh" if request.refresh else None,
+            lambda: extract_shipment_data(request.document_id, refresh=request.refresh),
+        )
+    except UpstreamOverloaded as e:
+        raise _overloaded_error(e)
     except Exception as e:
         raise HTTPException(
             status_code=500,
@@ -126,4 +362,46 @@ async def extract_structured_data(request: ExtractRequest):
         document_id=request.document_id,
         data=ShipmentData(**result["data"]),
         confidence=result["confidence"],
+        cached=result["cached"],
     )
+
+
+@router.post("/search", response_model=SearchResponse)
+async def search_documents(request: SearchRequest):
+    """
+    Semantic search across all uploaded documents. In a sharded cluster the
+    query is embedded once and searched on every node in parallel; per-node
+    results are merged into a global top_k. Unreachable nodes are listed in
+    `failed_nodes` instead of failing the request.
+    """
+    if not request.query.strip():
+        raise HTTPException(status_code=400, detail="Query cannot be empty.")
+    if not 1 <= request.top_k <= 50:
+        raise HTTPException(status_code=400, detail="top_k must be between 1 and 50.")
+
+    try:
+        query_embedding = (
+            await run_upstream(Priority.INTERACTIVE, embed_queries, [request.query])
+        )[0]
+        result = await cluster.scatter_search(query_embedding, request.top_k)
+    except UpstreamOverloaded as e:
+        raise _overloaded_error(e)
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error searching documents: {str(e)}",
+        )
+
+    return SearchResponse(**result)
+
+
+@router.get("/metrics")
+async def get_metrics():
+    """
+    Operational counters: how many ask/extract calls were coalesced onto an
+    identical in-flight request, and upstream scheduler limits and queues.
+    """
+    return {
+        "coalescing": get_coalescing_stats(),
+        "upstream": get_scheduler_stats(),
+    }
@@ -0,0 +1,190 @@
+"""
+Consistent-hash sharding of documents across several backend nodes.
+Each document lives on the node that owns its document_id on the hash ring;
+requests for it are forwarded there, and corpus-wide search fans out to every node.
+"""
+
+import asyncio
+import bisect
+import hashlib
+import hmac
+from typing import Optional, TYPE_CHECKING
+
+from app.config import (
+    CLUSTER_NODES,
+    CLUSTER_SELF_URL,
+    CLUSTER_TOKEN,
+    CLUSTER_VIRTUAL_NODES,
+    CLUSTER_REQUEST_TIMEOUT,
+)
+
+# numpy is only needed once a search runs
+if TYPE_CHECKING:
+    import numpy as np
+
+
+# Marks a request already routed by a peer, so it is never forwarded again
+FORWARDED_HEADER = "X-Shard-Forwarded"
+TOKEN_HEADER = "X-Cluster-Token"
+# Document id chosen by the node that routed an upload
+DOCUMENT_ID_HEADER = "X-Document-Id"
+
+
+class ShardUnavailable(Exception):
+    """Raised when the node owning a document cannot be reached."""
+
+    def __init__(self, node: str, reason: str):
+        super().__init__(f"Shard {node} is unavailable: {reason}")
+        self.node = node
+
+
+def _hash(key: str) -> int:
+    return int.from_bytes(hashlib.md5(key.encode("utf-8")).digest()[:8], "big")
+
+
+class HashRing:
+    """
+    Consistent hash ring with virtual nodes. Adding a node only moves the keys
+    that land on its points (about 1/N of them); all other keys keep their owner.
+    """
+
+    def __init__(self, nodes: list[str], virtual_nodes: int = CLUSTER_VIRTUAL_NODES):
+        self.nodes = sorted(set(nodes))
+        points = sorted(
+            (_hash(f"{node}#{i}"), node)
+            for node in self.nodes
+            for i in range(virtual_nodes)
+        )
+        self._hashes = [h for h, _ in points]
+        self._owners = [node for _, node in points]
+
+    def owner(self, key: str) -> str:
+        if not self._hashes:
+            raise ValueError("Hash ring has no nodes.")
+        i = bisect.bisect(self._hashes, _hash(key)) % len(self._hashes)
+        return self._owners[i]
+
+
+_ring = HashRing(CLUSTER_NODES)
+
+# Created on first forwarded request
+_http_client = None
+
+
+def is_enabled() -> bool:
+    """True when this process is one node of a multi-node cluster."""
+    return len(_ring.nodes) > 1 and bool(CLUSTER_SELF_URL)
+
+
+def config_errors(nodes: list[str], self_url: str, token: str) -> list[str]:
+    """Problems with a cluster configuration; empty when it is valid or clustering is off."""
+    if len(set(nodes)) <= 1 and not self_url:
+        return []
+    errors = []
+    if not self_url:
+        errors.append("CLUSTER_SELF_URL is not set.")
+    elif self_url not in nodes:
+        errors.append(f"CLUSTER_SELF_URL {self_url} is not listed in CLUSTER_NODES.")
+    if len(set(nodes)) > 1 and not token:
+        errors.append("CLUSTER_TOKEN is empty; nodes could not authenticate each other.")
+    return errors
+
+
+def validate_config():
+    """
+    Fail startup on a misconfigured cluster: without it, a node that is missing from
+    the ring or has no token serves traffic and every forwarded request fails.
+    """
+    errors = config_errors(CLUSTER_NODES, CLUSTER_SELF_URL, CLUSTER_TOKEN)
+    if errors:
+        raise ValueError("Invalid cluster configuration: " + " ".join(errors))
+
+
+def all_nodes() -> list[str]:
+    return list(_ring.nodes)
+
+
+def owner_of(document_id: str) -> str:
+    """Base URL of the node that stores a document."""
+    return _ring.owner(document_id)
+
+
+def is_local(document_id: str) -> bool:
+    return not is_enabled() or owner_of(document_id) == CLUSTER_SELF_URL
+
+
+def is_internal_request(headers) -> bool:
+    """Whether a request carries the cluster token (i.e. comes from a peer node)."""
+    token = headers.get(TOKEN_HEADER, "")
+    return bool(CLUSTER_TOKEN) and hmac.compare_digest(token, CLUSTER_TOKEN)
+
+
+def internal_headers() -> dict:
+    return {TOKEN_HEADER: CLUSTER_TOKEN, FORWARDED_HEADER: CLUSTER_SELF_URL}
+
+
+def _get_http_client():
+    global _http_client
+    if _http_client is None:
+        import httpx
+        _http_client = httpx.AsyncClient(timeout=CLUSTER_REQUEST_TIMEOUT)
+    return _http_client
+
+
+async def forward(node: str, method: str, path: str, headers: Optional[dict] = None, **kwargs):
+    """
+    Send a request to another node, authenticated with the cluster token.
+    Returns the httpx response; raises ShardUnavailable if the node cannot be reached.
+    """
+    import httpx
+    try:
+        return await _get_http_client().request(
+            method, f"{node}{path}", headers={**(headers or {}), **internal_headers()}, **kwargs
+        )
+    except httpx.HTTPError as e:
+        raise ShardUnavailable(node, str(e) or type(e).__name__)
+
+
+async def scatter_search(query_embedding: "np.ndarray", top_k: int = 5) -> dict:
+    """
+    Search every node's documents in parallel and merge the per-node top_k lists
+    into a global top_k by score. Nodes that fail are reported, not fatal.
+    """
+    from app.services.document_processor import search_all_documents
+
+    async def search_node(node: str) -> list[dict]:
+        if not is_enabled() or node == CLUSTER_SELF_URL:
+            return await asyncio.to_thread(search_all_documents, query_embedding, top_k)
+        response = await forward(
+            node,
+            "POST",
+            "/api/cluster/search",
+            json={"query_embedding": query_embedding.tolist(), "top_k": top_k},
+        )
+        if response.status_code != 200:
+            raise ShardUnavailable(node, f"HTTP {response.status_code}")
+        return response.json()["results"]
+
+    nodes = all_nodes() if is_enabled() else [CLUSTER_SELF_URL or "local"]
+    responses = await asyncio.gather(*(search_node(n) for n in nodes), return_exceptions=True)
+
+    results = []
+    failed_nodes = []
+    for node, response in zip(nodes, responses):
+        if isinstance(response, BaseException):
+            print(f"[cluster] Search on {node} failed: {response}")
+            failed_nodes.append(node)
+        else:
+            results.extend(response)
+
+    results.sort(key=lambda r: r["score"], reverse=True)
+    return {"results": results[:top_k], "failed_nodes": failed_nodes}
+
+
+def get_cluster_info() -> dict:
+    return {
+        "enabled": is_enabled(),
+        "self": CLUSTER_SELF_URL or None,
+        "nodes": all_nodes(),
+        "virtual_nodes": CLUSTER_VIRTUAL_NODES,
+    }
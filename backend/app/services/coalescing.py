@@ -0,0 +1,68 @@
+"""
+Single-flight request coalescing for expensive upstream LLM operations.
+Concurrent identical requests share one in-flight call instead of issuing their own.
+"""
+
+import asyncio
+from typing import Any, Awaitable, Callable, Optional
+
+
+# In-flight tasks keyed by (operation, document_id, normalized question)
+_in_flight: dict[tuple[str, str, str], asyncio.Task] = {}
+
+# Per-operation counters: calls actually executed vs. calls served by an in-flight one
+_stats: dict[str, dict[str, int]] = {}
+
+
+def normalize_question(question: Optional[str]) -> str:
+    """Normalize a question so trivially different phrasings share a key."""
+    if not question:
+        return ""
+    normalized = " ".join(question.casefold().split())
+    return normalized.rstrip("?!. ")
+
+
+def _record(operation: str, outcome: str):
+    counters = _stats.setdefault(operation, {"executed": 0, "coalesced": 0})
+    counters[outcome] += 1
+
+
+async def coalesce(
+    operation: str,
+    document_id: str,
+    question: Optional[str],
+    factory: Callable[[], Awaitable[Any]],
+) -> Any:
+    """
+    Run `factory()` once per distinct key; concurrent duplicates await the same result.
+    The shared task is shielded so one caller disconnecting does not cancel it for the others.
+    """
+    key = (operation, document_id, normalize_question(question))
+
+    task = _in_flight.get(key)
+    if task is None:
+        task = asyncio.ensure_future(factory())
+        _in_flight[key] = task
+
+        def _on_done(t: asyncio.Task):
+            if _in_flight.get(key) is t:
+                del _in_flight[key]
+            # Mark the exception as retrieved in case every awaiting caller went away
+            if not t.cancelled():
+                t.exception()
+
+        task.add_done_callback(_on_done)
+        _record(operation, "executed")
+    else:
+        _record(operation, "coalesced")
+
+    return await asyncio.shield(task)
+
+
+def get_coalescing_stats() -> dict:
+    """Return coalescing counters per operation plus the number of calls in flight."""
+    return {
+        "operations": {op: dict(counters) for op, counters in _stats.items()},
+        "total_coalesced": sum(c["coalesced"] for c in _stats.values()),
+        "in_flight": len(_in_flight),
+    }
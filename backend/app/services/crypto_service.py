@@ -4,8 +4,39 @@ AES-256-GCM encryption service for securing uploaded documents at rest.
 
 import os
 import base64
+import tempfile
+import threading
+from typing import Optional
 from cryptography.hazmat.primitives.ciphers.aead import AESGCM
-from app.config import AES_SECRET_KEY
+from app.config import AES_SECRET_KEY, MULTI_PROCESS, SHARED_STATE_DIR, SHARED_KEY_PATH
+
+
+def _load_or_create_shared_key() -> bytes:
+    """
+    Load the AES key shared by all worker processes, creating it if missing.
+    The key is written to a temp file and hard-linked into place, so exactly one
+    worker wins the race and every worker ends up reading the same key.
+    """
+    SHARED_STATE_DIR.mkdir(parents=True, exist_ok=True)
+    if not SHARED_KEY_PATH.exists():
+        encoded = base64.b64encode(AESGCM.generate_key(bit_length=256))
+        fd, tmp_path = tempfile.mkstemp(dir=SHARED_STATE_DIR)
+        try:
+            os.write(fd, encoded)
+            os.close(fd)
+            os.chmod(tmp_path, 0o600)
+            try:
+                os.link(tmp_path, SHARED_KEY_PATH)
+                print(f"[crypto_service] Generated shared AES key at {SHARED_KEY_PATH}.")
+            except FileExistsError:
+                pass  # Another worker created it first
+        finally:
+            os.unlink(tmp_path)
+
+    key = base64.b64decode(SHARED_KEY_PATH.read_bytes().strip())
+    if len(key) != 32:
+        raise ValueError(f"Shared AES key file {SHARED_KEY_PATH} does not contain a 32-byte key.")
+    return key
 
 
 def _get_key() -> bytes:
@@ -33,6 +64,9 @@ def _get_key() -> bytes:
             f"AES_SECRET_KEY is set but is not a valid 32-byte key. "
             f"Provide either 64 hex characters or a base64-encoded 32-byte string."
         )
+    elif MULTI_PROCESS:
+        # Workers must agree on one key, or files encrypted by one can't be read by another
+        return _load_or_create_shared_key()
     else:
         # Generate a new key (32 bytes = 256 bits)
         key = AESGCM.generate_key(bit_length=256)
@@ -40,7 +74,18 @@ def _get_key() -> bytes:
         return key
 
 
-_aes_key = _get_key()
+_aes_key: Optional[bytes] = None
+_aes_key_lock = threading.Lock()
+
+
+def get_aes_key() -> bytes:
+    """Return the AES key, resolving it on first use rather than at import time."""
+    global _aes_key
+    if _aes_key is None:
+        with _aes_key_lock:
+            if _aes_key is None:
+                _aes_key = _get_key()
+    return _aes_key
 
 
 def encrypt_file(file_data: bytes) -> bytes:
@@ -48,7 +93,7 @@ def encrypt_file(file_data: bytes) -> bytes:
     Encrypt file data using AES-256-GCM.
     Returns: nonce (12 bytes) + ciphertext
     """
-    aesgcm = AESGCM(_aes_key)
+    aesgcm = AESGCM(get_aes_key())
     nonce = os.urandom(12)  # 96-bit nonce for GCM
     ciphertext = aesgcm.encrypt(nonce, file_data, None)
     return nonce + ciphertext
@@ -59,7 +104,7 @@ def decrypt_file(encrypted_data: bytes) -> bytes:
     Decrypt file data encrypted with AES-256-GCM.
     Expects: nonce (12 bytes) + ciphertext
     """
-    aesgcm = AESGCM(_aes_key)
+    aesgcm = AESGCM(get_aes_key())
     nonce = encrypted_data[:12]
     ciphertext = encrypted_data[12:]
     return aesgcm.decrypt(nonce, ciphertext, None)
@@ -3,62 +3,115 @@ Document processing service: parsing, chunking, embedding, and FAISS storage.
 Handles PDF, DOCX, and TXT files.
 """
 
+import os
+import json
+import asyncio
+import hashlib
+import shutil
+import socket
+import tarfile
 import uuid
 import pickle
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
 from pathlib import Path
 from io import BytesIO
-
-import numpy as np
-import faiss
-from huggingface_hub import InferenceClient
-from langchain_text_splitters import RecursiveCharacterTextSplitter
+from typing import Iterator, Optional, TYPE_CHECKING
 
 from app.config import (
-    HF_API_TOKEN,
     EMBEDDING_MODEL_ID,
     UPLOAD_DIR,
     VECTOR_STORE_DIR,
     CHUNK_SIZE,
     CHUNK_OVERLAP,
     ALLOWED_EXTENSIONS,
+    MULTI_PROCESS,
+    INDEX_CACHE_SIZE,
+    VECTOR_COMPRESSION,
+    VECTOR_RERANK,
+    RERANK_CANDIDATES_FACTOR,
+    PQ_MIN_VECTORS,
+    PQ_SUBQUANTIZERS,
+    PROGRESSIVE_INGESTION,
+    EMBED_BATCH_SIZE,
+    INGEST_QUEUE_SIZE,
+    INGEST_MAX_RETRIES,
+    INGEST_RETRY_BUDGET,
+    INGEST_HEARTBEAT_INTERVAL,
+    INGEST_STALE_AFTER,
 )
 from app.services.crypto_service import encrypt_file, decrypt_file
+from app.services.hf_client import get_hf_client
+from app.services.scheduler import Priority, UpstreamOverloaded, run_upstream
+
+# faiss and numpy are imported inside the functions that use them, keeping app import fast
+if TYPE_CHECKING:
+    import faiss
+    import numpy as np
 
+try:
+    import fcntl  # Cross-process locking of reference counts (POSIX only)
+except ImportError:
+    fcntl = None
 
-# Initialize HF client for embeddings
-_hf_client = InferenceClient(token=HF_API_TOKEN)
 
-# In-memory store for document metadata
+# In-memory store for document metadata (per process; backed by meta.json on disk)
 _document_store: dict[str, dict] = {}
 
+# Per-process LRU of loaded indexes: document_id -> (index mtime_ns, index, chunks)
+_index_cache: "OrderedDict[str, tuple[int, faiss.Index, list[str]]]" = OrderedDict()
+_index_cache_lock = threading.Lock()
+
+# Content-addressed lookup: <sha256>.json -> document owning the artifacts for those bytes
+_CONTENT_DIR = VECTOR_STORE_DIR / "_content"
+# Latest document per filename, used to reuse embeddings when a document is re-issued
+_FILENAME_DIR = _CONTENT_DIR / "by_filename"
+
+# Alias document id -> document id owning the artifacts (targets never change, but aliases
+# can be deleted by another worker, so entries are checked against alias.json)
+_alias_cache: dict[str, str] = {}
+_refs_lock = threading.Lock()
 
-def _parse_pdf(file_bytes: bytes) -> str:
-    """Extract text from PDF bytes."""
+# Rewritten with a new token whenever any process adds, changes or removes a document's
+# index or references, so each process knows when its corpus aggregate is stale
+_CORPUS_VERSION_FILE = VECTOR_STORE_DIR / "corpus.version"
+# Per-process aggregate of every local document's vectors for corpus-wide search:
+# version token, artifact_id -> (index mtime_ns, vectors, chunks), and the merged arrays
+_corpus: dict = {"version": None, "documents": {}, "vectors": None, "rows": []}
+_corpus_lock = threading.Lock()
+
+
+def _parse_pdf(file_bytes: bytes) -> Iterator[str]:
+    """Extract text from PDF bytes, one page at a time."""
     from pypdf import PdfReader
     reader = PdfReader(BytesIO(file_bytes))
-    text_parts = []
     for page in reader.pages:
         page_text = page.extract_text()
         if page_text:
-            text_parts.append(page_text)
-    return "\n\n".join(text_parts)
+            yield page_text
 
 
-def _parse_docx(file_bytes: bytes) -> str:
-    """Extract text from DOCX bytes."""
+def _parse_docx(file_bytes: bytes) -> Iterator[str]:
+    """Extract text from DOCX bytes, one paragraph at a time."""
     from docx import Document
     doc = Document(BytesIO(file_bytes))
-    paragraphs = [p.text for p in doc.paragraphs if p.text.strip()]
-    return "\n\n".join(paragraphs)
+    for p in doc.paragraphs:
+        if p.text.strip():
+            yield p.text
 
 
-def _parse_txt(file_bytes: bytes) -> str:
+def _parse_txt(file_bytes: bytes) -> Iterator[str]:
     """Extract text from TXT bytes."""
-    return file_bytes.decode("utf-8", errors="replace")
+    yield file_bytes.decode("utf-8", errors="replace")
 
 
-def _parse_document(file_bytes: bytes, filename: str) -> str:
-    """Route to the correct parser based on file extension."""
+def _parse_document(file_bytes: bytes, filename: str) -> Iterator[str]:
+    """
+    Route to the correct parser based on file extension.
+    Yields text pieces (pages / paragraphs) that join with blank lines into the full text.
+    """
     ext = Path(filename).suffix.lower()
     if ext == ".pdf":
         return _parse_pdf(file_bytes)
@@ -72,6 +125,7 @@ def _parse_document(file_bytes: bytes, filename: str) -> str:
 
 def _chunk_text(text: str) -> list[str]:
     """Split text into overlapping chunks using recursive character splitter."""
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
     splitter = RecursiveCharacterTextSplitter(
         chunk_size=CHUNK_SIZE,
         chunk_overlap=CHUNK_OVERLAP,
@@ -82,9 +136,10 @@ def _chunk_text(text: str) -> list[str]:
     return chunks
 
 
-def _get_embeddings(texts: list[str]) -> np.ndarray:
+def _get_embeddings(texts: list[str]) -> "np.ndarray":
     """Get embeddings from HuggingFace Inference API."""
-    embeddings = _hf_client.feature_extraction(
+    import numpy as np
+    embeddings = get_hf_client().feature_extraction(
         texts,
         model=EMBEDDING_MODEL_ID,
     )
@@ -96,27 +151,679 @@ def _get_embeddings(texts: list[str]) -> np.ndarray:
     return arr
 
 
-def _save_faiss_index(document_id: str, index: faiss.IndexFlatIP, chunks: list[str]):
-    """Persist FAISS index and chunks to disk."""
+def _pq_subquantizers(dimension: int) -> int:
+    """Largest sub-quantizer count <= PQ_SUBQUANTIZERS that divides the dimension."""
+    m = min(PQ_SUBQUANTIZERS, dimension)
+    while dimension % m:
+        m -= 1
+    return m
+
+
+def _build_faiss_index(embeddings: "np.ndarray", compression: str = VECTOR_COMPRESSION) -> "faiss.Index":
+    """
+    Build an inner-product index (= cosine similarity for normalized vectors),
+    storing vectors as float32, fp16, int8 or PQ codes depending on `compression`.
+    """
+    import faiss
+    num_vectors, dimension = embeddings.shape
+    if compression == "pq" and num_vectors < PQ_MIN_VECTORS:
+        compression = "int8"
+
+    if compression == "fp16":
+        index = faiss.IndexScalarQuantizer(
+            dimension, faiss.ScalarQuantizer.QT_fp16, faiss.METRIC_INNER_PRODUCT
+        )
+    elif compression == "int8":
+        index = faiss.IndexScalarQuantizer(
+            dimension, faiss.ScalarQuantizer.QT_8bit, faiss.METRIC_INNER_PRODUCT
+        )
+    elif compression == "pq":
+        index = faiss.IndexPQ(
+            dimension, _pq_subquantizers(dimension), 8, faiss.METRIC_INNER_PRODUCT
+        )
+        # 256 centroids per sub-quantizer, trained on >= PQ_MIN_VECTORS points
+        index.pq.cp.min_points_per_centroid = PQ_MIN_VECTORS // 256
+    elif compression == "none":
+        index = faiss.IndexFlatIP(dimension)
+    else:
+        raise ValueError(f"Unknown vector compression '{compression}'. Use none, fp16, int8 or pq.")
+
+    if not index.is_trained:
+        index.train(embeddings)
+    index.add(embeddings)
+    return index
+
+
+def _needs_rerank_vectors(index: "faiss.Index") -> bool:
+    """Whether an index is lossy enough to keep vectors for re-ranking (int8 and PQ codes)."""
+    import faiss
+    if not VECTOR_RERANK or isinstance(index, faiss.IndexFlat):
+        return False
+    if isinstance(index, faiss.IndexScalarQuantizer):
+        return index.sq.qtype != faiss.ScalarQuantizer.QT_fp16
+    return True
+
+
+def _save_faiss_index(
+    document_id: str,
+    index: "faiss.Index",
+    chunks: list[str],
+    embeddings: Optional["np.ndarray"] = None,
+):
+    """
+    Persist FAISS index and chunks to disk.
+    For int8/PQ indexes, the vectors are also kept in vectors.npy (as fp16, half the
+    size of float32) to re-rank the top candidates.
+    """
+    import faiss
+    import numpy as np
     doc_dir = VECTOR_STORE_DIR / document_id
     doc_dir.mkdir(parents=True, exist_ok=True)
-    faiss.write_index(index, str(doc_dir / "index.faiss"))
-    with open(doc_dir / "chunks.pkl", "wb") as f:
+
+    # Files are replaced atomically, index last: a concurrent reader that sees the new
+    # index always finds chunks (and vectors) covering every id in it.
+    if embeddings is not None and _needs_rerank_vectors(index):
+        with open(doc_dir / "vectors.npy.tmp", "wb") as f:
+            np.save(f, embeddings.astype(np.float16))
+        os.replace(doc_dir / "vectors.npy.tmp", doc_dir / "vectors.npy")
+    with open(doc_dir / "chunks.pkl.tmp", "wb") as f:
         pickle.dump(chunks, f)
+    os.replace(doc_dir / "chunks.pkl.tmp", doc_dir / "chunks.pkl")
+    faiss.write_index(index, str(doc_dir / "index.faiss.tmp"))
+    os.replace(doc_dir / "index.faiss.tmp", doc_dir / "index.faiss")
+    _mark_corpus_changed()
+
+
+def _load_rerank_vectors(document_id: str) -> Optional["np.ndarray"]:
+    """Memory-map the vectors kept for re-ranking, if this document has them."""
+    import numpy as np
+    vectors_path = VECTOR_STORE_DIR / document_id / "vectors.npy"
+    if not VECTOR_RERANK or not vectors_path.exists():
+        return None
+    return np.load(vectors_path, mmap_mode="r")
 
 
-def _load_faiss_index(document_id: str) -> tuple[faiss.IndexFlatIP, list[str]]:
-    """Load FAISS index and chunks from disk."""
+def _load_float_vectors(document_id: str) -> Optional["np.ndarray"]:
+    """
+    Recover the float32 vectors of a document: from vectors.npy if present (stored
+    as fp16), otherwise by reconstructing a flat or fp16 index. None if neither is possible.
+    """
+    import faiss
+    import numpy as np
     doc_dir = VECTOR_STORE_DIR / document_id
+    vectors_path = doc_dir / "vectors.npy"
+    if vectors_path.exists():
+        return np.load(vectors_path).astype(np.float32)
     index = faiss.read_index(str(doc_dir / "index.faiss"))
+    if isinstance(index, faiss.IndexFlat) or (
+        isinstance(index, faiss.IndexScalarQuantizer)
+        and index.sq.qtype == faiss.ScalarQuantizer.QT_fp16
+    ):
+        return index.reconstruct_n(0, index.ntotal)
+    return None
+
+
+def _load_faiss_index(document_id: str, use_cache: bool = True) -> tuple["faiss.Index", list[str]]:
+    """
+    Load FAISS index and chunks, served from the per-process LRU cache when the
+    index file on disk has not changed since it was cached. With use_cache=False
+    (corpus-wide scans) a cached copy is still used, but the LRU order is left alone
+    and indexes read from disk are not cached.
+    """
+    import faiss
+    doc_dir = VECTOR_STORE_DIR / document_id
+    index_path = doc_dir / "index.faiss"
+    mtime_ns = index_path.stat().st_mtime_ns
+
+    with _index_cache_lock:
+        cached = _index_cache.get(document_id)
+        if cached is not None and cached[0] == mtime_ns:
+            if use_cache:
+                _index_cache.move_to_end(document_id)
+            return cached[1], cached[2]
+
+    # Memory-map index files so worker processes share the OS page cache instead of private copies
+    read_flags = getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP) if MULTI_PROCESS else 0
+    index = faiss.read_index(str(index_path), read_flags)
     with open(doc_dir / "chunks.pkl", "rb") as f:
         chunks = pickle.load(f)
+    if not use_cache:
+        return index, chunks
+
+    with _index_cache_lock:
+        _index_cache[document_id] = (mtime_ns, index, chunks)
+        _index_cache.move_to_end(document_id)
+        while len(_index_cache) > INDEX_CACHE_SIZE:
+            _index_cache.popitem(last=False)
     return index, chunks
 
 
-async def process_document(file_bytes: bytes, filename: str) -> dict:
+def _mark_used(document_id: str):
+    """Record the last use of a document (directory mtime) so warmup can find recent ones."""
+    try:
+        os.utime(VECTOR_STORE_DIR / document_id)
+    except OSError:
+        pass
+
+
+def preload_recent_indexes(limit: int) -> int:
+    """
+    Load the indexes of the most recently used documents into the index cache.
+    Returns the number of indexes loaded.
+    """
+    doc_dirs = [
+        d for d in VECTOR_STORE_DIR.iterdir()
+        if d.is_dir() and (d / "index.faiss").exists()
+    ]
+    doc_dirs.sort(key=lambda d: d.stat().st_mtime, reverse=True)
+
+    loaded = 0
+    for doc_dir in doc_dirs[:min(limit, INDEX_CACHE_SIZE)]:
+        try:
+            _load_faiss_index(doc_dir.name)
+            loaded += 1
+        except Exception as e:
+            print(f"[document_processor] Could not preload index {doc_dir.name}: {e}")
+    return loaded
+
+
+def _save_metadata(document_id: str, metadata: dict, include_text: bool = True):
+    """
+    Persist document metadata so every worker process can see it.
+    The full text is encrypted at rest like the original upload.
+    """
+    doc_dir = VECTOR_STORE_DIR / document_id
+    doc_dir.mkdir(parents=True, exist_ok=True)
+    public = {k: v for k, v in metadata.items() if k != "full_text"}
+    if include_text:
+        (doc_dir / "full_text.enc").write_bytes(encrypt_file(metadata["full_text"].encode("utf-8")))
+    (doc_dir / "meta.json.tmp").write_text(json.dumps(public), encoding="utf-8")
+    os.replace(doc_dir / "meta.json.tmp", doc_dir / "meta.json")
+
+
+def _load_metadata(document_id: str) -> Optional[dict]:
+    """Load metadata of a fully indexed document written by any worker, or None if unavailable."""
+    doc_dir = VECTOR_STORE_DIR / document_id
+    try:
+        metadata = json.loads((doc_dir / "meta.json").read_text(encoding="utf-8"))
+        if metadata.get("status", "ready") != "ready":
+            return None
+        metadata["full_text"] = decrypt_file((doc_dir / "full_text.enc").read_bytes()).decode("utf-8")
+    except Exception:
+        # Missing files, or text encrypted under a different (temporary) key
+        return None
+    _document_store[document_id] = metadata
+    return metadata
+
+
+def _ingestion_stalled(document_id: str) -> bool:
+    """Whether no live pipeline (in any worker) has touched this document's heartbeat recently."""
+    try:
+        age = time.time() - (VECTOR_STORE_DIR / document_id / "ingest.heartbeat").stat().st_mtime
+    except OSError:
+        return True
+    return age > INGEST_STALE_AFTER
+
+
+def _read_stored_metadata(document_id: str) -> dict:
     """
-    Full pipeline: parse → chunk → embed → store.
+    meta.json of a document (without the text). An "indexing" document whose pipeline
+    died with its process (restart, crash) is marked "failed" here, so it can be
+    deleted or re-uploaded instead of staying "indexing" forever.
+    """
+    meta = json.loads((VECTOR_STORE_DIR / document_id / "meta.json").read_text(encoding="utf-8"))
+    if meta.get("status") == "indexing" and _ingestion_stalled(document_id):
+        print(f"[document_processor] Ingestion of {document_id} stalled (owner {meta.get('ingest_owner')}); marking failed")
+        meta["status"] = "failed"
+        _save_metadata(document_id, meta, include_text=False)
+    return meta
+
+
+def get_document_status(document_id: str) -> str:
+    """
+    Ingestion status of a document: "indexing" (partially searchable),
+    "ready" or "failed". Documents without recorded status are "ready".
+    """
+    document_id = _resolve(document_id)
+    if document_id in _document_store:
+        return _document_store[document_id].get("status", "ready")
+    try:
+        meta = _read_stored_metadata(document_id)
+    except (OSError, ValueError):
+        return "ready"
+    return meta.get("status", "ready")
+
+
+def get_document_info(document_id: str) -> dict:
+    """Status and number of chunks indexed so far for a document."""
+    document_id = _resolve(document_id)
+    if document_id in _document_store:
+        metadata = _document_store[document_id]
+    else:
+        try:
+            metadata = _read_stored_metadata(document_id)
+        except (OSError, ValueError):
+            _, chunks = _load_faiss_index(document_id)
+            metadata = {"num_chunks": len(chunks)}
+    return {
+        "status": metadata.get("status", "ready"),
+        "num_chunks": metadata.get("num_chunks", 0),
+    }
+
+
+def _resolve(document_id: str) -> str:
+    """Map a document id to the id whose directory holds its artifacts (itself unless an alias)."""
+    if document_id in _alias_cache:
+        # Aliases are deleted by any worker; a cached mapping is only valid while alias.json exists
+        if (VECTOR_STORE_DIR / document_id / "alias.json").exists():
+            return _alias_cache[document_id]
+        _alias_cache.pop(document_id, None)
+    try:
+        alias = json.loads((VECTOR_STORE_DIR / document_id / "alias.json").read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return document_id
+    _alias_cache[document_id] = alias["target"]
+    return alias["target"]
+
+
+def _is_valid_document_id(document_id: str) -> bool:
+    try:
+        uuid.UUID(document_id)
+    except ValueError:
+        return False
+    return True
+
+
+@contextmanager
+def _locked_refs(artifact_id: str):
+    """
+    Yield the (mutable) list of document ids referencing an artifact directory,
+    holding a lock across threads and worker processes; it is saved on exit.
+    """
+    doc_dir = VECTOR_STORE_DIR / artifact_id
+    refs_path = doc_dir / "refs.json"
+    with _refs_lock, open(doc_dir / "refs.lock", "a") as lock_file:
+        if fcntl is not None:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            refs = json.loads(refs_path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            refs = [artifact_id]
+        yield refs
+        (doc_dir / "refs.json.tmp").write_text(json.dumps(refs), encoding="utf-8")
+        os.replace(doc_dir / "refs.json.tmp", refs_path)
+    _mark_corpus_changed()
+
+
+def _register_content(document_id: str, content_hash: str, filename: str):
+    """Record a fully indexed document as the owner of its content hash and filename."""
+    _CONTENT_DIR.mkdir(parents=True, exist_ok=True)
+    _FILENAME_DIR.mkdir(parents=True, exist_ok=True)
+    entry = json.dumps({"document_id": document_id})
+    (_CONTENT_DIR / f"{content_hash}.json").write_text(entry, encoding="utf-8")
+    filename_key = hashlib.sha256(filename.encode("utf-8")).hexdigest()
+    (_FILENAME_DIR / f"{filename_key}.json").write_text(entry, encoding="utf-8")
+
+
+def _lookup_content(path: Path) -> Optional[str]:
+    """Read a content/filename entry, returning its document id if it is still fully indexed."""
+    try:
+        document_id = json.loads(path.read_text(encoding="utf-8"))["document_id"]
+    except (OSError, ValueError, KeyError):
+        return None
+    if not (VECTOR_STORE_DIR / document_id / "index.faiss").exists():
+        return None
+    if get_document_status(document_id) != "ready":
+        return None
+    return document_id
+
+
+def _find_duplicate(content_hash: str) -> Optional[str]:
+    """Document id already holding artifacts for identical bytes, if any."""
+    return _lookup_content(_CONTENT_DIR / f"{content_hash}.json")
+
+
+def _reusable_embeddings(filename: str) -> dict[str, "np.ndarray"]:
+    """
+    Chunk text -> embedding from the latest document uploaded under the same filename,
+    so a re-issued document only embeds the chunks that changed.
+    """
+    filename_key = hashlib.sha256(filename.encode("utf-8")).hexdigest()
+    previous_id = _lookup_content(_FILENAME_DIR / f"{filename_key}.json")
+    if previous_id is None:
+        return {}
+    try:
+        _, chunks = _load_faiss_index(previous_id)
+        vectors = _load_float_vectors(previous_id)
+    except Exception:
+        return {}
+    if vectors is None or len(vectors) != len(chunks):
+        return {}
+    return dict(zip(chunks, vectors))
+
+
+def _create_alias(artifact_id: str, filename: str, document_id: Optional[str] = None) -> str:
+    """Create a new document id (or use the given one) sharing the artifacts of an existing document."""
+    document_id = document_id or str(uuid.uuid4())
+    with _locked_refs(artifact_id) as refs:
+        refs.append(document_id)
+        alias_dir = VECTOR_STORE_DIR / document_id
+        alias_dir.mkdir(parents=True, exist_ok=True)
+        alias = {"target": artifact_id, "filename": filename}
+        (alias_dir / "alias.json").write_text(json.dumps(alias), encoding="utf-8")
+    _alias_cache[document_id] = artifact_id
+    return document_id
+
+
+def delete_document(document_id: str) -> bool:
+    """
+    Delete a document. Artifacts shared with duplicate uploads are reference counted
+    and only removed when the last document using them is deleted.
+    Returns False if the document does not exist.
+    """
+    if not _is_valid_document_id(document_id) or not document_exists(document_id):
+        return False
+
+    artifact_id = _resolve(document_id)
+    with _locked_refs(artifact_id) as refs:
+        if document_id in refs:
+            refs.remove(document_id)
+        remaining = list(refs)
+
+    if document_id != artifact_id:
+        shutil.rmtree(VECTOR_STORE_DIR / document_id, ignore_errors=True)
+        _alias_cache.pop(document_id, None)
+    else:
+        # Artifacts may still be used by aliases; hide this id until they are gone
+        (VECTOR_STORE_DIR / document_id / "deleted").touch()
+
+    if not remaining:
+        _purge_artifacts(artifact_id)
+    return True
+
+
+def _upload_files(artifact_id: str) -> list[Path]:
+    """
+    Encrypted upload(s) stored for an artifact. Matched by prefix, since documents
+    stored before file_ext was recorded in meta.json have no extension on file.
+    """
+    return sorted(UPLOAD_DIR.glob(f"{artifact_id}*.enc"))
+
+
+def _purge_artifacts(artifact_id: str):
+    """Remove an artifact directory, its encrypted upload and content entries."""
+    doc_dir = VECTOR_STORE_DIR / artifact_id
+    try:
+        meta = json.loads((doc_dir / "meta.json").read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        meta = {}
+
+    content_entries = []
+    if meta.get("content_hash"):
+        content_entries.append(_CONTENT_DIR / f"{meta['content_hash']}.json")
+    if meta.get("filename"):
+        filename_key = hashlib.sha256(meta["filename"].encode("utf-8")).hexdigest()
+        content_entries.append(_FILENAME_DIR / f"{filename_key}.json")
+    for entry in content_entries:
+        try:
+            if json.loads(entry.read_text(encoding="utf-8"))["document_id"] == artifact_id:
+                entry.unlink()
+        except (OSError, ValueError, KeyError):
+            pass
+
+    for upload_path in _upload_files(artifact_id):
+        upload_path.unlink(missing_ok=True)
+    shutil.rmtree(doc_dir, ignore_errors=True)
+    _document_store.pop(artifact_id, None)
+    with _index_cache_lock:
+        _index_cache.pop(artifact_id, None)
+    _mark_corpus_changed()
+
+
+def get_content_hash(document_id: str) -> str:
+    """
+    SHA-256 identifying a document's content: of the uploaded bytes when recorded,
+    otherwise of the extracted text (documents stored before hashing was added).
+    """
+    document_id = _resolve(document_id)
+    metadata = _document_store.get(document_id)
+    if metadata is None:
+        try:
+            metadata = json.loads((VECTOR_STORE_DIR / document_id / "meta.json").read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            metadata = {}
+    if metadata.get("content_hash"):
+        return metadata["content_hash"]
+    return hashlib.sha256(get_full_text(document_id).encode("utf-8")).hexdigest()
+
+
+def list_local_document_ids() -> list[str]:
+    """All live document ids stored on this node, including aliases."""
+    document_ids = []
+    for doc_dir in VECTOR_STORE_DIR.iterdir():
+        if not doc_dir.is_dir() or not _is_valid_document_id(doc_dir.name):
+            continue
+        if (doc_dir / "alias.json").exists() or (
+            (doc_dir / "index.faiss").exists() and not (doc_dir / "deleted").exists()
+        ):
+            document_ids.append(doc_dir.name)
+    return sorted(document_ids)
+
+
+def _mark_corpus_changed():
+    """Invalidate the corpus aggregate in every process."""
+    tmp_path = VECTOR_STORE_DIR / f"corpus.version.{uuid.uuid4().hex}.tmp"
+    tmp_path.write_text(uuid.uuid4().hex, encoding="utf-8")
+    os.replace(tmp_path, _CORPUS_VERSION_FILE)
+
+
+def _read_corpus_version() -> str:
+    try:
+        return _CORPUS_VERSION_FILE.read_text(encoding="utf-8")
+    except OSError:
+        return ""
+
+
+def _load_corpus_vectors(artifact_id: str) -> tuple["np.ndarray", list[str]]:
+    """A document's float32 vectors (decoded from its index if need be) and chunks."""
+    import faiss
+    import numpy as np
+    doc_dir = VECTOR_STORE_DIR / artifact_id
+    with open(doc_dir / "chunks.pkl", "rb") as f:
+        chunks = pickle.load(f)
+    vectors = _load_float_vectors(artifact_id)
+    if vectors is None:
+        # int8/PQ without re-rank vectors: decode the approximate vectors
+        index = faiss.read_index(str(doc_dir / "index.faiss"))
+        vectors = index.reconstruct_n(0, index.ntotal)
+    # Files may be mid-replacement by an ingestion save; keep the rows both cover
+    n = min(len(vectors), len(chunks))
+    return np.ascontiguousarray(vectors[:n], dtype=np.float32), chunks[:n]
+
+
+def _refresh_corpus():
+    """
+    Bring the corpus aggregate up to date with the store. Only documents whose index
+    changed since the last refresh are read from disk.
+    """
+    import numpy as np
+    version = _read_corpus_version()
+    if _corpus["vectors"] is not None and _corpus["version"] == version:
+        return
+
+    documents = {}
+    rows = []  # (document_id, filename, chunk) per aggregate row
+    parts = []
+    for doc_dir in VECTOR_STORE_DIR.iterdir():
+        if not _is_valid_document_id(doc_dir.name):
+            continue
+        artifact_id = doc_dir.name
+        try:
+            mtime_ns = (doc_dir / "index.faiss").stat().st_mtime_ns
+        except OSError:
+            continue
+        try:
+            refs = json.loads((doc_dir / "refs.json").read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            refs = [artifact_id]
+        if not refs:
+            continue
+        try:
+            meta = json.loads((doc_dir / "meta.json").read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            meta = {}
+
+        cached = _corpus["documents"].get(artifact_id)
+        if cached is not None and cached[0] == mtime_ns:
+            vectors, chunks = cached[1], cached[2]
+        else:
+            try:
+                vectors, chunks = _load_corpus_vectors(artifact_id)
+            except Exception as e:
+                # One unreadable document should not fail the whole node's search
+                print(f"[document_processor] Skipping {artifact_id} in search: {e}")
+                continue
+        documents[artifact_id] = (mtime_ns, vectors, chunks)
+        parts.append(vectors)
+        rows.extend((refs[0], meta.get("filename", ""), chunk) for chunk in chunks)
+
+    _corpus["documents"] = documents
+    _corpus["rows"] = rows
+    _corpus["vectors"] = np.concatenate(parts) if parts else np.zeros((0, 0), dtype=np.float32)
+    _corpus["version"] = version
+
+
+def search_all_documents(query_embedding: "np.ndarray", top_k: int = 5) -> list[dict]:
+    """
+    Search every document stored on this node with one query vector.
+    Returns the overall top_k as {document_id, filename, text, score} dicts.
+    """
+    import numpy as np
+    # Queries search a per-process aggregate of all vectors, rebuilt only when the
+    # corpus changes; it bypasses the index LRU and last-used times, so corpus-wide
+    # search does not evict hot indexes or reorder what warmup preloads
+    with _corpus_lock:
+        _refresh_corpus()
+        vectors, rows = _corpus["vectors"], _corpus["rows"]
+    if not rows:
+        return []
+
+    scores = vectors @ np.asarray(query_embedding, dtype=np.float32).reshape(-1)
+    k = min(top_k, len(rows))
+    top = np.argpartition(-scores, k - 1)[:k]
+    top = top[np.argsort(-scores[top])]
+    return [
+        {
+            "document_id": rows[i][0],
+            "filename": rows[i][1],
+            "text": rows[i][2],
+            "score": float(scores[i]),
+        }
+        for i in top
+    ]
+
+
+# Files that make up a document when moving it between nodes
+_BUNDLE_FILES = {
+    "index.faiss", "chunks.pkl", "vectors.npy", "meta.json", "full_text.enc",
+    "extraction.json", "suggested_questions.json", "upload.enc",
+}
+
+
+def export_document_bundle(document_id: str) -> bytes:
+    """
+    Package a document's artifacts (and encrypted upload) as a tar.gz so another
+    node can import it. Aliases are exported as standalone documents.
+    """
+    artifact_id = _resolve(document_id)
+    doc_dir = VECTOR_STORE_DIR / artifact_id
+    meta = json.loads((doc_dir / "meta.json").read_text(encoding="utf-8"))
+    if meta.get("status", "ready") != "ready":
+        raise ValueError(f"Document '{document_id}' is still being indexed.")
+    if artifact_id != document_id:
+        alias = json.loads((VECTOR_STORE_DIR / document_id / "alias.json").read_text(encoding="utf-8"))
+        meta["filename"] = alias["filename"]
+
+    buffer = BytesIO()
+    with tarfile.open(fileobj=buffer, mode="w:gz") as tar:
+        for name in sorted(_BUNDLE_FILES - {"meta.json", "upload.enc"}):
+            if (doc_dir / name).exists():
+                tar.add(doc_dir / name, arcname=name)
+        for upload_path in _upload_files(artifact_id)[:1]:
+            tar.add(upload_path, arcname="upload.enc")
+        meta_bytes = json.dumps(meta).encode("utf-8")
+        info = tarfile.TarInfo("meta.json")
+        info.size = len(meta_bytes)
+        tar.addfile(info, BytesIO(meta_bytes))
+    return buffer.getvalue()
+
+
+def import_document_bundle(document_id: str, bundle: bytes):
+    """
+    Install a document exported by another node under the same document id.
+    Raises FileExistsError if the id already exists here, ValueError for a bad bundle.
+    """
+    if not _is_valid_document_id(document_id):
+        raise ValueError(f"Invalid document id '{document_id}'.")
+    doc_dir = VECTOR_STORE_DIR / document_id
+    if doc_dir.exists():
+        raise FileExistsError(f"Document '{document_id}' already exists on this node.")
+
+    staging_dir = VECTOR_STORE_DIR / "_imports" / document_id
+    shutil.rmtree(staging_dir, ignore_errors=True)
+    staging_dir.mkdir(parents=True)
+    try:
+        with tarfile.open(fileobj=BytesIO(bundle), mode="r:gz") as tar:
+            for member in tar.getmembers():
+                if not member.isfile() or member.name not in _BUNDLE_FILES:
+                    raise ValueError(f"Unexpected entry '{member.name}' in document bundle.")
+                (staging_dir / member.name).write_bytes(tar.extractfile(member).read())
+        if not (staging_dir / "index.faiss").exists() or not (staging_dir / "meta.json").exists():
+            raise ValueError("Document bundle is missing its index or metadata.")
+    except (tarfile.TarError, OSError) as e:
+        shutil.rmtree(staging_dir, ignore_errors=True)
+        raise ValueError(f"Invalid document bundle: {e}")
+    except ValueError:
+        shutil.rmtree(staging_dir, ignore_errors=True)
+        raise
+
+    meta = json.loads((staging_dir / "meta.json").read_text(encoding="utf-8"))
+    if (staging_dir / "upload.enc").exists():
+        os.replace(staging_dir / "upload.enc", UPLOAD_DIR / f"{document_id}{meta.get('file_ext', '')}.enc")
+    os.replace(staging_dir, doc_dir)
+    _mark_corpus_changed()
+
+    if meta.get("content_hash") and meta.get("status") == "ready" and _find_duplicate(meta["content_hash"]) is None:
+        _register_content(document_id, meta["content_hash"], meta.get("filename", ""))
+
+
+def load_document_artifact(document_id: str, name: str):
+    """Load a JSON artifact stored alongside a document (shared by its aliases), or None."""
+    path = VECTOR_STORE_DIR / _resolve(document_id) / name
+    try:
+        return json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+
+
+def save_document_artifact(document_id: str, name: str, data):
+    """Atomically store a JSON artifact alongside a document."""
+    doc_dir = VECTOR_STORE_DIR / _resolve(document_id)
+    (doc_dir / f"{name}.tmp").write_text(json.dumps(data), encoding="utf-8")
+    os.replace(doc_dir / f"{name}.tmp", doc_dir / name)
+
+
+# Ingestion pipelines still running after their upload request returned
+_background_ingestions: set[asyncio.Task] = set()
+
+
+async def process_document(file_bytes: bytes, filename: str, document_id: Optional[str] = None) -> dict:
+    """
+    Full pipeline: parse → chunk → embed → store, run as streaming stages.
+    With progressive ingestion, returns as soon as the first batch of chunks is
+    searchable and finishes indexing in the background (status "indexing").
+    `document_id` lets a cluster node store the upload under an id chosen by the
+    node that routed it here; a new id is generated otherwise.
     Returns document metadata.
     """
     # Validate file type
@@ -124,48 +831,241 @@ async def process_document(file_bytes: bytes, filename: str) -> dict:
     if ext not in ALLOWED_EXTENSIONS:
         raise ValueError(f"File type '{ext}' not supported. Allowed: {ALLOWED_EXTENSIONS}")
 
+    # Identical bytes resolve to the existing artifacts: no parse/embed/index
+    content_hash = hashlib.sha256(file_bytes).hexdigest()
+    duplicate_of = _find_duplicate(content_hash)
+    if duplicate_of is not None:
+        document_id = _create_alias(duplicate_of, filename, document_id)
+        info = get_document_info(duplicate_of)
+        return {
+            "document_id": document_id,
+            "filename": filename,
+            "num_chunks": info["num_chunks"],
+            "status": info["status"],
+            # The id of the existing document is never returned: ids are the only access control
+            "deduplicated": True,
+        }
+
     # Generate unique document ID
-    document_id = str(uuid.uuid4())
+    document_id = document_id or str(uuid.uuid4())
 
     # Encrypt and save the original file
     encrypted = encrypt_file(file_bytes)
     encrypted_path = UPLOAD_DIR / f"{document_id}{ext}.enc"
     encrypted_path.write_bytes(encrypted)
 
-    # Parse the document
-    text = _parse_document(file_bytes, filename)
-    if not text.strip():
-        raise ValueError("No text could be extracted from the document.")
-
-    # Chunk the text
-    chunks = _chunk_text(text)
-
-    # Generate embeddings
-    embeddings = _get_embeddings(chunks)
-
-    # Build FAISS index (Inner Product = cosine similarity for normalized vectors)
-    dimension = embeddings.shape[1]
-    index = faiss.IndexFlatIP(dimension)
-    index.add(embeddings)
-
-    # Save to disk
-    _save_faiss_index(document_id, index, chunks)
-
-    # Store metadata in memory
-    _document_store[document_id] = {
+    # Metadata is updated in place as the pipeline progresses
+    metadata = {
         "filename": filename,
-        "num_chunks": len(chunks),
-        "full_text": text,
+        "num_chunks": 0,
+        "full_text": "",
         "file_ext": ext,
+        "status": "indexing",
+        "content_hash": content_hash,
+        "ingest_owner": f"{socket.gethostname()}:{os.getpid()}",
     }
+    _document_store[document_id] = metadata
+
+    first_batch_indexed = asyncio.Event()
+    pipeline = asyncio.create_task(
+        _run_ingestion_pipeline(
+            document_id, file_bytes, filename, content_hash, metadata, first_batch_indexed
+        )
+    )
+
+    if PROGRESSIVE_INGESTION:
+        waiter = asyncio.create_task(first_batch_indexed.wait())
+        await asyncio.wait({pipeline, waiter}, return_when=asyncio.FIRST_COMPLETED)
+        waiter.cancel()
+    if not PROGRESSIVE_INGESTION or pipeline.done():
+        await pipeline  # Propagates parse/embedding errors to the upload request
+    else:
+        _background_ingestions.add(pipeline)
+        pipeline.add_done_callback(_on_background_ingestion_done)
 
     return {
         "document_id": document_id,
         "filename": filename,
-        "num_chunks": len(chunks),
+        "num_chunks": metadata["num_chunks"],
+        "status": metadata["status"],
+        "deduplicated": False,
     }
 
 
+def _on_background_ingestion_done(task: asyncio.Task):
+    _background_ingestions.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        print(f"[document_processor] Background ingestion failed: {task.exception()}")
+
+
+async def _run_ingestion_pipeline(
+    document_id: str,
+    file_bytes: bytes,
+    filename: str,
+    content_hash: str,
+    metadata: dict,
+    first_batch_indexed: asyncio.Event,
+):
+    """
+    Streaming ingestion: page parse → chunk → embed batch → index append, connected
+    by bounded queues so a slow stage applies backpressure to the ones before it.
+    The index is saved after the first batch, so the document is searchable early,
+    and then each time it has doubled in size.
+    """
+    import faiss
+    import numpy as np
+
+    page_queue: asyncio.Queue = asyncio.Queue(maxsize=INGEST_QUEUE_SIZE)
+    chunk_queue: asyncio.Queue = asyncio.Queue(maxsize=INGEST_QUEUE_SIZE)
+    embed_queue: asyncio.Queue = asyncio.Queue(maxsize=INGEST_QUEUE_SIZE)
+    pages: list[str] = []
+
+    async def parse_stage():
+        page_iter = _parse_document(file_bytes, filename)
+        while (page := await asyncio.to_thread(next, page_iter, None)) is not None:
+            await page_queue.put(page)
+        await page_queue.put(None)
+
+    async def chunk_stage():
+        buffer = ""
+        batch: list[str] = []
+
+        async def emit(chunks: list[str]):
+            nonlocal batch
+            for chunk in chunks:
+                batch.append(chunk)
+                if len(batch) >= EMBED_BATCH_SIZE:
+                    await chunk_queue.put(batch)
+                    batch = []
+
+        while (page := await page_queue.get()) is not None:
+            pages.append(page)
+            buffer = f"{buffer}\n\n{page}" if buffer else page
+            if len(buffer) >= CHUNK_SIZE * 4:
+                # Keep the last chunk as carry-over so it can extend into the next page.
+                # Boundaries can still differ slightly from splitting the whole text at once.
+                chunks = _chunk_text(buffer)
+                await emit(chunks[:-1])
+                buffer = chunks[-1]
+
+        if not "".join(pages).strip():
+            raise ValueError("No text could be extracted from the document.")
+        if buffer.strip():
+            await emit(_chunk_text(buffer))
+        if batch:
+            await chunk_queue.put(batch)
+        await chunk_queue.put(None)
+
+    async def _embed_ingest_batch(texts: list[str]) -> np.ndarray:
+        loop = asyncio.get_running_loop()
+        give_up_at = loop.time() + INGEST_RETRY_BUDGET
+        for attempt in range(INGEST_MAX_RETRIES + 1):
+            try:
+                return await run_upstream(Priority.UPLOAD, _get_embeddings, texts)
+            except UpstreamOverloaded as e:
+                # Before the upload has returned, push back on the client;
+                # afterwards, keep the background ingestion going once capacity frees up,
+                # within a bounded budget (the document is then marked "failed")
+                if (
+                    not first_batch_indexed.is_set()
+                    or attempt == INGEST_MAX_RETRIES
+                    or loop.time() + e.retry_after > give_up_at
+                ):
+                    raise
+                await asyncio.sleep(e.retry_after)
+
+    async def embed_stage():
+        # Only chunks not present in the previous issue of this document are embedded
+        reusable = await asyncio.to_thread(_reusable_embeddings, filename)
+        while (batch := await chunk_queue.get()) is not None:
+            missing = [chunk for chunk in batch if chunk not in reusable]
+            if missing:
+                new_embeddings = await _embed_ingest_batch(missing)
+                reusable.update(zip(missing, new_embeddings))
+            metadata["reused_chunks"] = metadata.get("reused_chunks", 0) + len(batch) - len(missing)
+            embeddings = np.vstack([reusable[chunk] for chunk in batch]).astype(np.float32)
+            await embed_queue.put((batch, embeddings))
+        await embed_queue.put(None)
+
+    async def index_stage():
+        # Appends go to a flat index; compression (which needs training) is applied at the end
+        index = None
+        chunks: list[str] = []
+        batches: list[np.ndarray] = []
+        saved = 0
+
+        async def save():
+            nonlocal saved
+            await asyncio.to_thread(_save_faiss_index, document_id, index, list(chunks))
+            heartbeat_path.touch()  # Before "indexing" is visible to other workers
+            saved = len(chunks)
+            metadata["num_chunks"] = saved
+            metadata["full_text"] = "\n\n".join(pages)
+            await asyncio.to_thread(_save_metadata, document_id, metadata, False)
+            first_batch_indexed.set()
+
+        while (item := await embed_queue.get()) is not None:
+            batch, embeddings = item
+            if index is None:
+                index = faiss.IndexFlatIP(embeddings.shape[1])
+            index.add(embeddings)
+            chunks.extend(batch)
+            batches.append(embeddings)
+
+            # Each save rewrites the whole index, so save once the indexed size has
+            # doubled: total bytes written stay linear in the document size
+            if len(chunks) >= 2 * saved:
+                await save()
+        if index is not None and saved < len(chunks):
+            await save()
+        return chunks, batches
+
+    heartbeat_path = VECTOR_STORE_DIR / document_id / "ingest.heartbeat"
+
+    async def heartbeat():
+        # Lets other workers tell this running pipeline from one that died
+        await first_batch_indexed.wait()
+        while True:
+            await asyncio.sleep(INGEST_HEARTBEAT_INTERVAL)
+            heartbeat_path.touch()
+
+    heartbeat_task = asyncio.create_task(heartbeat())
+    stages = [
+        asyncio.create_task(parse_stage()),
+        asyncio.create_task(chunk_stage()),
+        asyncio.create_task(embed_stage()),
+        asyncio.create_task(index_stage()),
+    ]
+    try:
+        await asyncio.gather(*stages)
+        chunks, batches = stages[-1].result()
+
+        # Re-encode with the configured compression now that all vectors are known
+        if VECTOR_COMPRESSION != "none":
+            embeddings = np.vstack(batches)
+            index = await asyncio.to_thread(_build_faiss_index, embeddings)
+            await asyncio.to_thread(_save_faiss_index, document_id, index, chunks, embeddings)
+
+        metadata["num_chunks"] = len(chunks)
+        metadata["full_text"] = "\n\n".join(pages)
+        metadata["status"] = "ready"
+        await asyncio.to_thread(_save_metadata, document_id, metadata)
+        await asyncio.to_thread(_register_content, document_id, content_hash, filename)
+    except BaseException:
+        for stage in stages:
+            stage.cancel()
+        if first_batch_indexed.is_set():
+            # Keep what was indexed searchable, but never report it as complete
+            metadata["status"] = "failed"
+            _save_metadata(document_id, metadata, include_text=False)
+        else:
+            _document_store.pop(document_id, None)
+        raise
+    finally:
+        heartbeat_task.cancel()
+        heartbeat_path.unlink(missing_ok=True)
+
+
 def search_similar_chunks(
     document_id: str, query: str, top_k: int = 5
 ) -> list[dict]:
@@ -173,39 +1073,100 @@ def search_similar_chunks(
     Search for chunks most similar to the query.
     Returns list of {text, score} dicts sorted by relevance.
     """
-    # Get query embedding
-    query_embedding = _get_embeddings([query])
+    return search_similar_chunks_batch(document_id, [query], top_k=top_k)[0]
+
+
+def embed_queries(queries: list[str]) -> "np.ndarray":
+    """Embed search queries (normalized, one row per query)."""
+    return _get_embeddings(queries)
+
+
+def search_similar_chunks_batch(
+    document_id: str,
+    queries: list[str],
+    top_k: int = 5,
+    query_embeddings: Optional["np.ndarray"] = None,
+) -> list[list[dict]]:
+    """
+    Search for chunks similar to several queries at once: one embedding call,
+    one index load and one batched FAISS search over the query matrix.
+    Pass precomputed `query_embeddings` to skip the embedding call.
+    Returns one list of {text, score} dicts per query, in query order.
+    """
+    document_id = _resolve(document_id)
+
+    # Get query embeddings
+    if query_embeddings is None:
+        query_embeddings = _get_embeddings(queries)
 
     # Load index
     index, chunks = _load_faiss_index(document_id)
+    _mark_used(document_id)
+    return _search_index(document_id, index, chunks, query_embeddings, top_k)
 
-    # Search
+
+def _search_index(
+    document_id: str,
+    index: "faiss.Index",
+    chunks: list[str],
+    query_embeddings: "np.ndarray",
+    top_k: int,
+) -> list[list[dict]]:
+    """Batched search of one loaded index; one list of {text, score} dicts per query row."""
+    import numpy as np
+    # Search (over-fetch candidates when they will be re-ranked exactly)
     k = min(top_k, len(chunks))
-    scores, indices = index.search(query_embedding, k)
+    rerank_vectors = _load_rerank_vectors(document_id)
+    num_candidates = k
+    if rerank_vectors is not None:
+        num_candidates = min(k * RERANK_CANDIDATES_FACTOR, len(chunks))
+    scores, indices = index.search(query_embeddings, num_candidates)
+
+    all_results = []
+    for q in range(len(query_embeddings)):
+        candidates = [
+            (int(idx), float(score))
+            for idx, score in zip(indices[q], scores[q])
+            if idx >= 0
+        ]
+
+        # Re-rank compressed-index candidates with exact float32 similarity
+        if rerank_vectors is not None and candidates:
+            ids = np.array([idx for idx, _ in candidates])
+            exact_scores = np.asarray(rerank_vectors[ids]) @ query_embeddings[q]
+            candidates = sorted(
+                zip(ids.tolist(), exact_scores.tolist()), key=lambda c: c[1], reverse=True
+            )
 
-    results = []
-    for i in range(k):
-        idx = indices[0][i]
-        score = float(scores[0][i])
-        if idx >= 0:
+        results = []
+        for idx, score in candidates[:k]:
             results.append({
                 "text": chunks[idx],
                 "score": score,
             })
+        all_results.append(results)
 
-    return results
+    return all_results
 
 
 def get_full_text(document_id: str) -> str:
     """Get the full extracted text for a document."""
+    document_id = _resolve(document_id)
     if document_id in _document_store:
         return _document_store[document_id]["full_text"]
+    # Document may have been processed by another worker
+    metadata = _load_metadata(document_id)
+    if metadata is not None:
+        return metadata["full_text"]
     # Fallback: reconstruct from chunks
     _, chunks = _load_faiss_index(document_id)
     return "\n".join(chunks)
 
 
 def document_exists(document_id: str) -> bool:
-    """Check if a document has been processed."""
+    """Check if a document has been processed (directly or as a duplicate of another)."""
     doc_dir = VECTOR_STORE_DIR / document_id
-    return doc_dir.exists() and (doc_dir / "index.faiss").exists()
+    if (doc_dir / "deleted").exists():
+        return False
+    artifact_dir = VECTOR_STORE_DIR / _resolve(document_id)
+    return artifact_dir.exists() and (artifact_dir / "index.faiss").exists()
@@ -3,13 +3,21 @@ Structured extraction service: extracts shipment data as JSON from documents.
 """
 
 import json
-from huggingface_hub import InferenceClient
+import hashlib
+from datetime import datetime, timezone
+from typing import Optional
+
+from app.config import LLM_MODEL_ID
+from app.services.document_processor import (
+    get_full_text,
+    get_content_hash,
+    get_document_status,
+    load_document_artifact,
+    save_document_artifact,
+)
+from app.services.hf_client import get_hf_client
+from app.services.scheduler import Priority, run_upstream
 
-from app.config import HF_API_TOKEN, LLM_MODEL_ID
-from app.services.document_processor import get_full_text
-
-
-_hf_client = InferenceClient(token=HF_API_TOKEN)
 
 EXTRACTION_PROMPT = """You are a precise logistics document data extraction AI.
 
@@ -41,11 +49,37 @@ STRICT RULES:
 Also include a "confidence" field (0.0-1.0) indicating overall extraction confidence."""
 
 
-async def extract_shipment_data(document_id: str) -> dict:
+# Stored alongside the document (shared by duplicate uploads)
+EXTRACTION_ARTIFACT = "extraction.json"
+
+# Any edit to the prompt yields a new version and invalidates stored results
+EXTRACTION_PROMPT_VERSION = hashlib.sha256(EXTRACTION_PROMPT.encode("utf-8")).hexdigest()[:12]
+
+
+def extraction_cache_key(document_id: str) -> str:
+    """Key for a stored extraction: document content + model id + prompt version."""
+    key_material = f"{get_content_hash(document_id)}:{LLM_MODEL_ID}:{EXTRACTION_PROMPT_VERSION}"
+    return hashlib.sha256(key_material.encode("utf-8")).hexdigest()
+
+
+def load_stored_extraction(document_id: str) -> Optional[dict]:
+    """The stored extraction record for a document, whether or not it is current."""
+    return load_document_artifact(document_id, EXTRACTION_ARTIFACT)
+
+
+async def extract_shipment_data(document_id: str, refresh: bool = False) -> dict:
     """
     Extract structured shipment data from a document.
-    Returns ShipmentData fields + confidence.
+    Results are persisted and served from storage while the document content,
+    model and prompt version are unchanged; `refresh=True` forces a new LLM call.
+    Returns ShipmentData fields + confidence + whether the result was cached.
     """
+    cache_key = extraction_cache_key(document_id)
+    if not refresh:
+        stored = load_stored_extraction(document_id)
+        if stored is not None and stored.get("key") == cache_key:
+            return {**stored["result"], "cached": True}
+
     # Get full document text
     full_text = get_full_text(document_id)
 
@@ -60,7 +94,9 @@ async def extract_shipment_data(document_id: str) -> dict:
         {"role": "user", "content": f"DOCUMENT TEXT:\n{full_text}\n\nExtract the structured shipment data as JSON."},
     ]
 
-    response = _hf_client.chat_completion(
+    response = await run_upstream(
+        Priority.BACKGROUND,
+        get_hf_client().chat_completion,
         model=LLM_MODEL_ID,
         messages=messages,
         max_tokens=1024,
@@ -78,7 +114,10 @@ async def extract_shipment_data(document_id: str) -> dict:
             cleaned = cleaned.split("```")[1].split("```")[0].strip()
 
         data = json.loads(cleaned)
+        parsed = isinstance(data, dict)
     except (json.JSONDecodeError, IndexError):
+        parsed = False
+    if not parsed:
         # Fallback: all nulls
         data = {}
 
@@ -98,7 +137,20 @@ async def extract_shipment_data(document_id: str) -> dict:
         val = data.get(field)
         shipment_data[field] = val if val is not None else None
 
-    return {
+    result = {
         "data": shipment_data,
         "confidence": round(confidence, 3),
     }
+
+    # Only complete documents are persisted; partial text would give a partial extraction.
+    # An unparseable reply is likely transient and is not stored, so the next call retries.
+    if parsed and get_document_status(document_id) == "ready":
+        save_document_artifact(document_id, EXTRACTION_ARTIFACT, {
+            "key": cache_key,
+            "model_id": LLM_MODEL_ID,
+            "prompt_version": EXTRACTION_PROMPT_VERSION,
+            "extracted_at": datetime.now(timezone.utc).isoformat(),
+            "result": result,
+        })
+
+    return {**result, "cached": False}
@@ -0,0 +1,150 @@
+"""
+Extractive fast path: answers direct field lookups ("What is the weight?") by
+pulling the labeled value span out of the retrieved chunks, without an LLM call.
+"""
+
+import re
+from typing import Optional
+
+
+# Known logistics fields: the noun phrases a question may ask for (the whole
+# question must be "What is the <phrase>?"), and document labels
+FIELD_PATTERNS = {
+    "shipment_id": {
+        # Other identifiers (BOL, PRO, PO numbers) are left to the LLM to tell apart
+        "question": r"(shipment|load)\s*(id|#|number|no\.?)",
+        "label": r"shipment\s*(?:id|#|number|no\.?)|load\s*(?:id|#|number|no\.?)",
+    },
+    "shipper": {
+        "question": r"shipper(\s+name)?|sender",
+        "label": r"shipper(?:\s*name)?|ship\s*from|sender",
+    },
+    "consignee": {
+        "question": r"consignee(\s+name)?|receiver|recipient",
+        "label": r"consignee(?:\s*name)?|ship\s*to|receiver|recipient",
+    },
+    "pickup_datetime": {
+        "question": r"pick\s*-?up(\s+(date|time|datetime|date\s+and\s+time|appointment))?|ship\s+date",
+        "label": r"pick\s*-?up\s*(?:date\s*/\s*time|date|time|datetime|appointment)|ship\s*date",
+    },
+    "delivery_datetime": {
+        "question": r"delivery(\s+(date|time|datetime|date\s+and\s+time|appointment))?|drop\s*-?off\s+(date|time)",
+        "label": r"deliver(?:y)?\s*(?:date\s*/\s*time|date|time|datetime|appointment)|drop\s*-?off\s*(?:date|time)",
+    },
+    "equipment_type": {
+        "question": r"equipment(\s+type)?|(trailer|truck)\s+type",
+        "label": r"equipment(?:\s*type)?|trailer\s*type|truck\s*type",
+    },
+    "mode": {
+        "question": r"((transport(ation)?|shipping|service)\s+)?mode(\s+of\s+transport(ation)?)?",
+        "label": r"(?:transport(?:ation)?\s*|shipping\s*|service\s*)?mode",
+    },
+    "rate": {
+        "question": r"((total|agreed|carrier|line\s*haul)\s+)?rate|price|(total\s+)?(cost|amount)|freight\s+charges?",
+        "label": r"(?:total\s*|line\s*haul\s*|linehaul\s*|agreed\s*|carrier\s*)?rate|total\s*(?:cost|amount|charges?)|freight\s*charges?",
+    },
+    "weight": {
+        "question": r"((total|gross|net)\s+)?weight",
+        "label": r"(?:total\s*|gross\s*|net\s*)?weight",
+    },
+    "carrier_name": {
+        "question": r"carrier(\s+name)?|trucking\s+company",
+        "label": r"carrier(?:\s*name)?",
+    },
+}
+
+# Any known label, used to cut a value where the next labeled field on the same line starts
+_ANY_LABEL = "|".join(f"(?:{patterns['label']})" for patterns in FIELD_PATTERNS.values())
+
+# Fields whose values must contain a digit to be plausible
+_NUMERIC_FIELDS = {"shipment_id", "pickup_datetime", "delivery_datetime", "rate", "weight"}
+
+# Datetime values must look like a date or time, not just contain a digit (an address does)
+_DATETIME_FIELDS = {"pickup_datetime", "delivery_datetime"}
+_MONTHS = r"jan|feb|mar|apr|may|jun|jul|aug|sep|oct|nov|dec"
+_DATE_OR_TIME = re.compile(
+    rf"\b\d{{1,4}}[/.-]\d{{1,2}}[/.-]\d{{1,4}}\b"          # 03/14/2025, 2025-03-14
+    rf"|\b(?:{_MONTHS})[a-z]*\.?\s+\d{{1,2}}\b"             # March 14
+    rf"|\b\d{{1,2}}\s+(?:{_MONTHS})[a-z]*\b"                 # 14 March
+    rf"|\b\d{{1,2}}:\d{{2}}\b|\b\d{{1,2}}\s*[ap]\.?m\b",      # 14:00, 2 PM
+    re.IGNORECASE,
+)
+
+# Only plain single-field lookups qualify: "What is the X?", "Who is the X of this load?".
+# Anything after the field phrase ("carrier MC number", "shipper address") is a different question.
+_QUESTION_PREFIX = r"^\s*(what|who|which|when)('s|\s+is|\s+was|\s+are)?(\s+the)?\s+"
+_QUESTION_SUFFIX = r"(\s+(of|for|on)\s+(the|this)\s+(shipment|load|document|order))?\s*[?.!]*\s*$"
+
+# Confidence by rank of the chunk the value came from
+_RANK_CONFIDENCE = [0.95, 0.88, 0.8]
+
+
+def _match_field(question: str) -> Optional[str]:
+    """The single field a direct lookup question asks for, or None."""
+    matches = [
+        field for field, patterns in FIELD_PATTERNS.items()
+        if re.match(
+            f"{_QUESTION_PREFIX}({patterns['question']}){_QUESTION_SUFFIX}", question, re.IGNORECASE
+        )
+    ]
+    return matches[0] if len(matches) == 1 else None
+
+
+def _find_values(field: str, text: str) -> list[tuple[str, str]]:
+    """All (value, source line) pairs labeled as `field` in a chunk, e.g. "Weight: 42,000 lbs"."""
+    label = FIELD_PATTERNS[field]["label"]
+    pattern = re.compile(
+        rf"(?:^|[\s|;,])(?:{label})\s*[:=]\s*(?P<value>[^\n|;]+)",
+        re.IGNORECASE,
+    )
+    values = []
+    for match in pattern.finditer(text):
+        # A following "Other Label:" on the same line ends the value
+        value = re.split(
+            rf"\s{{2,}}|\s+(?:{_ANY_LABEL})\s*[:=]", match.group("value"), flags=re.IGNORECASE
+        )[0]
+        value = value.strip(" .,\t")
+        if not value or len(value) > 80:
+            continue
+        if field in _NUMERIC_FIELDS and not re.search(r"\d", value):
+            continue
+        if field in _DATETIME_FIELDS and not _DATE_OR_TIME.search(value):
+            continue
+        line_start = text.rfind("\n", 0, match.start("value")) + 1
+        line_end = text.find("\n", match.end("value"))
+        values.append((value, text[line_start:line_end if line_end != -1 else None].strip()))
+    return values
+
+
+def extract_direct_answer(question: str, search_results: list[dict]) -> Optional[dict]:
+    """
+    Answer a direct field lookup from the top retrieved chunks.
+    Returns {answer, confidence, source_text, field} or None if the question is not
+    a direct lookup or no labeled value was found. Conflicting values across the
+    top chunks lower the confidence so the caller falls back to the LLM.
+    """
+    field = _match_field(question)
+    if field is None:
+        return None
+
+    found = []  # (rank, value, source line)
+    for rank, result in enumerate(search_results[:len(_RANK_CONFIDENCE)]):
+        for value, source in _find_values(field, result["text"]):
+            found.append((rank, value, source))
+    if not found:
+        return None
+
+    rank, value, source = found[0]
+    distinct = {v.casefold() for _, v, _ in found}
+    confidence = _RANK_CONFIDENCE[rank]
+    if len(distinct) > 1:
+        confidence -= 0.3
+    elif len(found) > 1:
+        confidence = min(1.0, confidence + 0.03)
+
+    return {
+        "answer": value,
+        "confidence": round(confidence, 3),
+        "source_text": source,
+        "field": field,
+    }
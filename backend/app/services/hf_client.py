@@ -0,0 +1,23 @@
+"""
+Shared HuggingFace Inference API client, created on first use so that importing
+the app does not pay for huggingface_hub or client setup.
+"""
+
+import threading
+
+from app.config import HF_API_TOKEN
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_hf_client():
+    """Return the process-wide InferenceClient, creating it on first call."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                from huggingface_hub import InferenceClient
+                _client = InferenceClient(token=HF_API_TOKEN)
+    return _client
@@ -3,20 +3,33 @@ RAG service: retrieval-augmented generation for document Q&A.
 Uses HuggingFace Inference API for LLM completion.
 """
 
+import asyncio
 import json
-from huggingface_hub import InferenceClient
+from typing import Optional
 
-from app.config import HF_API_TOKEN, LLM_MODEL_ID, TOP_K_CHUNKS
-from app.services.document_processor import search_similar_chunks
+from app.config import (
+    LLM_MODEL_ID,
+    TOP_K_CHUNKS,
+    BATCH_PROMPT_QUESTIONS,
+    BATCH_LLM_CONCURRENCY,
+    EXTRACTIVE_CONFIDENCE_THRESHOLD,
+    EXTRACTIVE_MIN_SIMILARITY,
+)
+from app.services.document_processor import embed_queries, search_similar_chunks_batch
 from app.services.guardrails import (
     evaluate_retrieval_quality,
     compute_final_confidence,
     build_guardrail_prompt,
 )
-from app.services.document_processor import get_full_text
-
-
-_hf_client = InferenceClient(token=HF_API_TOKEN)
+from app.services.document_processor import (
+    get_document_status,
+    get_full_text,
+    load_document_artifact,
+    save_document_artifact,
+)
+from app.services.hf_client import get_hf_client
+from app.services.scheduler import Priority, UpstreamOverloaded, run_upstream
+from app.services.extractive_service import extract_direct_answer
 
 
 def _build_context(search_results: list[dict]) -> str:
@@ -27,35 +40,57 @@ def _build_context(search_results: list[dict]) -> str:
     return "\n\n---\n\n".join(context_parts)
 
 
-def _call_llm(system_prompt: str, user_prompt: str) -> str:
+def _build_sources(search_results: list[dict]) -> list[dict]:
+    """Top 3 retrieved chunks as answer sources."""
+    return [
+        {"text": r["text"], "similarity_score": r["score"]}
+        for r in search_results[:3]
+    ]
+
+
+# Strictly professional, concise answers
+ANSWER_SYSTEM_PROMPT = """You are a precise, professional logistics document assistant.
+Answer the user's question using ONLY the provided document context.
+Your answers should be:
+1. Short, specific, and very accurate.
+2. NOT chatty. Do not use phrases like "Based on the document", "The text mentions", "Here is the answer".
+3. Direct. Just give the answer.
+4. If the answer is not in the context, say exactly: "The requested information is not available in the uploaded document."
+"""
+
+
+def _call_llm(system_prompt: str, user_prompt: str, max_tokens: int = 1024) -> str:
     """Call HuggingFace LLM via Inference API."""
     messages = [
         {"role": "system", "content": system_prompt},
         {"role": "user", "content": user_prompt},
     ]
 
-    response = _hf_client.chat_completion(
+    response = get_hf_client().chat_completion(
         model=LLM_MODEL_ID,
         messages=messages,
-        max_tokens=1024,
+        max_tokens=max_tokens,
         temperature=0.1,  # Low temperature for precise, deterministic answers
     )
 
     return response.choices[0].message.content.strip()
 
 
+def _strip_code_fence(raw_response: str) -> str:
+    """Handle case where LLM wraps JSON in markdown code blocks."""
+    cleaned = raw_response
+    if "```json" in cleaned:
+        cleaned = cleaned.split("```json")[1].split("```")[0].strip()
+    elif "```" in cleaned:
+        cleaned = cleaned.split("```")[1].split("```")[0].strip()
+    return cleaned
+
+
 def _parse_llm_response(raw_response: str) -> dict:
     """Parse LLM JSON response, with fallback for non-JSON responses."""
     # Try to extract JSON from the response
     try:
-        # Handle case where LLM wraps JSON in markdown code blocks
-        cleaned = raw_response
-        if "```json" in cleaned:
-            cleaned = cleaned.split("```json")[1].split("```")[0].strip()
-        elif "```" in cleaned:
-            cleaned = cleaned.split("```")[1].split("```")[0].strip()
-
-        parsed = json.loads(cleaned)
+        parsed = json.loads(_strip_code_fence(raw_response))
         return {
             "answer": parsed.get("answer", raw_response),
             "confidence": float(parsed.get("confidence", 0.5)),
@@ -70,10 +105,50 @@ def _parse_llm_response(raw_response: str) -> dict:
         }
 
 
-def generate_suggested_questions(document_id: str) -> list[str]:
+def _parse_batch_response(raw_response: str, num_questions: int) -> dict[int, dict]:
+    """
+    Parse the JSON array answering a combined prompt into {question index: parsed answer}.
+    Entries that are missing, malformed or out of range are left out, so the caller
+    can ask those questions again on their own.
+    """
+    try:
+        items = json.loads(_strip_code_fence(raw_response))
+    except (json.JSONDecodeError, IndexError, ValueError):
+        return {}
+    if isinstance(items, dict):
+        items = items.get("answers", [])
+    if not isinstance(items, list):
+        return {}
+
+    answers = {}
+    for item in items:
+        if not isinstance(item, dict):
+            continue
+        try:
+            index = int(item["id"]) - 1
+            confidence = float(item.get("confidence", 0.5))
+        except (KeyError, TypeError, ValueError):
+            continue
+        answer = item.get("answer")
+        if 0 <= index < num_questions and isinstance(answer, str) and answer.strip():
+            answers[index] = {
+                "answer": answer.strip(),
+                "confidence": confidence,
+                "source_text": item.get("source_text", ""),
+            }
+    return answers
+
+
+async def generate_suggested_questions(document_id: str) -> list[str]:
     """
     Generate 5 unique, short, specific questions based on the document content.
+    Questions generated once the document is fully indexed are stored with it and
+    reused by duplicate uploads; ones from a partially indexed document are not.
     """
+    cached = load_document_artifact(document_id, "suggested_questions.json")
+    if cached:
+        return cached
+
     # Get first 3000 chars of text to generate questions from
     full_text = get_full_text(document_id)
     context_snippet = full_text[:3000]
@@ -92,15 +167,19 @@ Do not number them. Just provide 5 lines, one question per line.
     ]
 
     try:
-        response = _hf_client.chat_completion(
+        response = await run_upstream(
+            Priority.BACKGROUND,
+            get_hf_client().chat_completion,
             model=LLM_MODEL_ID,
             messages=messages,
             max_tokens=256,
             temperature=0.7, 
         )
         content = response.choices[0].message.content.strip()
-        questions = [q.strip("- ").strip() for q in content.split("\n") if q.strip()]
-        return questions[:5]
+        questions = [q.strip("- ").strip() for q in content.split("\n") if q.strip()][:5]
+        if questions and get_document_status(document_id) == "ready":
+            save_document_artifact(document_id, "suggested_questions.json", questions)
+        return questions
     except Exception:
         return [
             "What is the shipment ID?",
@@ -118,8 +197,141 @@ async def ask_question(document_id: str, question: str) -> dict:
     Returns answer with sources, confidence, and guardrail status.
     """
     # Step 1: Retrieve similar chunks
-    search_results = search_similar_chunks(document_id, question, top_k=TOP_K_CHUNKS)
+    # Blocking calls run in worker threads so concurrent requests can overlap;
+    # upstream calls also go through the scheduler at interactive priority
+    query_embeddings = await run_upstream(Priority.INTERACTIVE, embed_queries, [question])
+    search_results = (await asyncio.to_thread(
+        search_similar_chunks_batch, document_id, [question], TOP_K_CHUNKS, query_embeddings
+    ))[0]
+
+    return await _answer_from_results(question, search_results)
+
+
+async def ask_questions_batch(document_id: str, questions: list[str]) -> list[dict]:
+    """
+    RAG pipeline for several questions on one document.
+    Retrieval is a single embedding call plus one batched FAISS search. Questions
+    the guardrail or the extractive fast path settle need no LLM; the rest are
+    asked BATCH_PROMPT_QUESTIONS at a time in one combined prompt, with at most
+    BATCH_LLM_CONCURRENCY calls in flight so a large batch does not flood the
+    upstream queue. Questions a combined reply leaves unanswered are asked again
+    on their own. Results are returned in question order; a question that fails
+    gets an "error" result instead of failing the batch.
+    """
+    query_embeddings = await run_upstream(Priority.INTERACTIVE, embed_queries, questions)
+    batch_results = await asyncio.to_thread(
+        search_similar_chunks_batch, document_id, questions, TOP_K_CHUNKS, query_embeddings
+    )
+
+    results: list[Optional[dict]] = [None] * len(questions)
+    pending = []  # (index, quality) of questions that need the LLM
+    for i, (question, search_results) in enumerate(zip(questions, batch_results)):
+        results[i], quality = _answer_without_llm(question, search_results)
+        if results[i] is None:
+            pending.append((i, quality))
+
+    semaphore = asyncio.Semaphore(BATCH_LLM_CONCURRENCY)
+    errors: list[Exception] = []
+
+    def error_result(e: Exception) -> dict:
+        errors.append(e)
+        return {
+            "answer": f"This question could not be answered: {e}",
+            "sources": [],
+            "confidence": 0.0,
+            "guardrail_status": "error",
+        }
+
+    async def answer_alone(i: int, quality: dict):
+        # One failing question must not throw away the answers already paid for
+        try:
+            async with semaphore:
+                results[i] = await _answer_with_llm(questions[i], batch_results[i], quality)
+        except Exception as e:
+            results[i] = error_result(e)
+
+    async def answer_group(group: list[tuple[int, dict]]):
+        if len(group) == 1:
+            return await answer_alone(*group[0])
+        group_questions = [questions[i] for i, _ in group]
+        try:
+            async with semaphore:
+                raw_response = await run_upstream(
+                    Priority.INTERACTIVE,
+                    _call_llm,
+                    ANSWER_SYSTEM_PROMPT,
+                    _build_batch_prompt(group_questions, [batch_results[i] for i, _ in group]),
+                    256 * len(group),
+                )
+            answers = _parse_batch_response(raw_response, len(group))
+        except UpstreamOverloaded as e:
+            # Retrying each question alone would only add load to an overloaded upstream
+            for i, _ in group:
+                results[i] = error_result(e)
+            return
+        except Exception as e:
+            print(f"[rag] Combined prompt for {len(group)} questions failed: {e}")
+            answers = {}
+
+        missing = []
+        for position, (i, quality) in enumerate(group):
+            if position in answers:
+                results[i] = _scored_llm_answer(answers[position], batch_results[i], quality)
+            else:
+                missing.append((i, quality))
+        await asyncio.gather(*(answer_alone(i, quality) for i, quality in missing))
+
+    groups = [pending[n:n + BATCH_PROMPT_QUESTIONS] for n in range(0, len(pending), BATCH_PROMPT_QUESTIONS)]
+    await asyncio.gather(*(answer_group(group) for group in groups))
+
+    # Nothing answered because upstream is overloaded: let the client retry the batch
+    if len(errors) == len(questions) and all(isinstance(e, UpstreamOverloaded) for e in errors):
+        raise errors[0]
+    return results
+
+
+def _build_batch_prompt(questions: list[str], batch_results: list[list[dict]]) -> str:
+    """
+    One prompt for several questions: the chunks retrieved for any of them, listed
+    once, and each question with the numbers of its own chunks in relevance order.
+    """
+    chunk_numbers: dict[str, int] = {}
+    context_parts = []
+    question_lines = []
+    for n, (question, search_results) in enumerate(zip(questions, batch_results), 1):
+        numbers = []
+        for result in search_results:
+            if result["text"] not in chunk_numbers:
+                chunk_numbers[result["text"]] = len(chunk_numbers) + 1
+                context_parts.append(f"[Chunk {chunk_numbers[result['text']]}]\n{result['text']}")
+            numbers.append(str(chunk_numbers[result["text"]]))
+        question_lines.append(f"[Q{n}] {question} (relevant chunks: {', '.join(numbers)})")
+
+    context = "\n\n---\n\n".join(context_parts)
+    return f"""DOCUMENT CONTEXT:
+{context}
+
+QUESTIONS:
+{chr(10).join(question_lines)}
+
+Answer every question using ONLY the document context above, mainly its relevant chunks.
+Reply with only a JSON array holding one object per question, in this form:
+[{{"id": 1, "answer": "...", "confidence": 0.0 to 1.0, "source_text": "..."}}]"""
+
+
+async def _answer_from_results(question: str, search_results: list[dict]) -> dict:
+    """Guardrail check → generate → score, given the chunks retrieved for a question."""
+    result, quality = _answer_without_llm(question, search_results)
+    if result is not None:
+        return result
+    return await _answer_with_llm(question, search_results, quality)
+
 
+def _answer_without_llm(question: str, search_results: list[dict]) -> tuple[Optional[dict], dict]:
+    """
+    Answer from retrieval alone when possible: a guardrail refusal or a direct field
+    lookup. Returns (result or None if the LLM is needed, retrieval quality).
+    """
     # Step 2: Evaluate retrieval quality (guardrail gate 1)
     quality = evaluate_retrieval_quality(search_results)
     if quality["status"] in ("no_context", "refused"):
@@ -128,21 +340,33 @@ async def ask_question(document_id: str, question: str) -> dict:
             "sources": [],
             "confidence": quality["retrieval_score"],
             "guardrail_status": quality["status"],
-        }
+        }, quality
+
+    # Step 3: Fast path: direct field lookups answered from a labeled span, no LLM call
+    # Only when retrieval is strong: the extractive confidence alone would pass gate 2
+    # with almost any retrieval score
+    extracted = None
+    if quality["best_score"] >= EXTRACTIVE_MIN_SIMILARITY:
+        extracted = extract_direct_answer(question, search_results)
+    if extracted is not None and extracted["confidence"] >= EXTRACTIVE_CONFIDENCE_THRESHOLD:
+        final_confidence, guardrail_status = compute_final_confidence(
+            quality["retrieval_score"], extracted["confidence"]
+        )
+        if guardrail_status == "grounded":
+            return {
+                "answer": extracted["answer"],
+                "sources": _build_sources(search_results),
+                "confidence": round(final_confidence, 3),
+                "guardrail_status": "extracted",
+            }, quality
 
-    # Step 3: Build context and prompt
+    return None, quality
+
+
+async def _answer_with_llm(question: str, search_results: list[dict], quality: dict) -> dict:
+    """Ask the LLM a single question about its retrieved chunks."""
+    # Step 4: Build context and prompt
     context = _build_context(search_results)
-    
-    # Updated prompt for strictly professional, concise answers
-    system_prompt = """You are a precise, professional logistics document assistant.
-Answer the user's question using ONLY the provided document context.
-Your answers should be:
-1. Short, specific, and very accurate.
-2. NOT chatty. Do not use phrases like "Based on the document", "The text mentions", "Here is the answer".
-3. Direct. Just give the answer.
-4. If the answer is not in the context, say exactly: "The requested information is not available in the uploaded document."
-"""
-    
     user_prompt = f"""DOCUMENT CONTEXT:
 {context}
 
@@ -150,26 +374,22 @@ QUESTION: {question}
 
 Answer the question using ONLY the document context above."""
 
-    # Step 4: Call LLM
-    raw_response = _call_llm(system_prompt, user_prompt)
+    # Step 5: Call LLM
+    raw_response = await run_upstream(Priority.INTERACTIVE, _call_llm, ANSWER_SYSTEM_PROMPT, user_prompt)
 
-    # Step 5: Parse LLM response
-    parsed = _parse_llm_response(raw_response)
+    # Step 6: Parse LLM response
+    return _scored_llm_answer(_parse_llm_response(raw_response), search_results, quality)
 
-    # Step 6: Compute final confidence (guardrail gate 2)
+
+def _scored_llm_answer(parsed: dict, search_results: list[dict], quality: dict) -> dict:
+    # Step 7: Compute final confidence (guardrail gate 2)
     final_confidence, guardrail_status = compute_final_confidence(
         quality["retrieval_score"], parsed["confidence"]
     )
 
-    # Step 7: Build sources list
-    sources = [
-        {"text": r["text"], "similarity_score": r["score"]}
-        for r in search_results[:3]  # Top 3 sources
-    ]
-
     return {
         "answer": parsed["answer"],
-        "sources": sources,
+        "sources": _build_sources(search_results),
         "confidence": round(final_confidence, 3),
         "guardrail_status": guardrail_status,
     }
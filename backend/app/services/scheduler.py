@@ -0,0 +1,167 @@
+"""
+Upstream scheduler: every LLM and embedding call goes through a shared,
+priority-ordered set of concurrency slots.
+
+- Priority classes: interactive ask > upload ingestion > extraction/suggestions.
+- Adaptive limit (AIMD): grows while calls are fast, shrinks on upstream 429s
+  and on latency above target.
+- Bounded per-priority queues with wait deadlines; overflow raises
+  UpstreamOverloaded, which the API turns into 503/429 with Retry-After.
+"""
+
+import asyncio
+import heapq
+import itertools
+import math
+import time
+from enum import IntEnum
+from typing import Any, Callable
+
+from app.config import (
+    UPSTREAM_INITIAL_CONCURRENCY,
+    UPSTREAM_MIN_CONCURRENCY,
+    UPSTREAM_MAX_CONCURRENCY,
+    UPSTREAM_TARGET_LATENCY,
+    UPSTREAM_QUEUE_LIMITS,
+    UPSTREAM_QUEUE_DEADLINES,
+)
+
+
+class Priority(IntEnum):
+    INTERACTIVE = 0  # /api/ask
+    UPLOAD = 1       # document ingestion embeddings
+    BACKGROUND = 2   # extraction, suggested questions
+
+
+class UpstreamOverloaded(Exception):
+    """Raised when a call cannot be scheduled; carries the HTTP status and Retry-After seconds."""
+
+    def __init__(self, message: str, status_code: int = 503, retry_after: int = 1):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+def _rate_limit_retry_after(error: Exception):
+    """Return the Retry-After seconds if `error` is an upstream HTTP 429, else None."""
+    response = getattr(error, "response", None)
+    if getattr(response, "status_code", None) != 429:
+        return None
+    try:
+        return max(1, int(response.headers.get("Retry-After", 5)))
+    except (TypeError, ValueError):
+        return 5
+
+
+class UpstreamScheduler:
+    def __init__(self):
+        self._limit = float(UPSTREAM_INITIAL_CONCURRENCY)
+        self._active = 0
+        self._waiters: list[tuple[int, int, asyncio.Future]] = []
+        self._queued = {p: 0 for p in Priority}
+        self._seq = itertools.count()
+        self._avg_latency = 1.0
+        self._stats = {
+            p.name.lower(): {"completed": 0, "rejected": 0, "timed_out": 0, "rate_limited": 0}
+            for p in Priority
+        }
+
+    async def run(self, priority: Priority, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """Wait for a slot at `priority`, then run the blocking `fn` in a worker thread."""
+        await self._acquire(priority)
+        start = time.perf_counter()
+        try:
+            result = await asyncio.to_thread(fn, *args, **kwargs)
+        except Exception as e:
+            retry_after = _rate_limit_retry_after(e)
+            if retry_after is None:
+                raise
+            self._limit = max(UPSTREAM_MIN_CONCURRENCY, self._limit / 2)
+            self._stats[priority.name.lower()]["rate_limited"] += 1
+            raise UpstreamOverloaded(
+                "Upstream model API is rate limiting requests.",
+                status_code=429,
+                retry_after=retry_after,
+            ) from e
+        finally:
+            self._active -= 1
+            self._dispatch()
+        self._on_success(priority, time.perf_counter() - start)
+        return result
+
+    async def _acquire(self, priority: Priority):
+        self._dispatch()  # Drop abandoned waiters so they cannot block the fast path
+        if self._active < int(self._limit) and not self._waiters:
+            self._active += 1
+            return
+
+        name = priority.name.lower()
+        if self._queued[priority] >= UPSTREAM_QUEUE_LIMITS[name]:
+            self._stats[name]["rejected"] += 1
+            raise UpstreamOverloaded(
+                f"Too many pending {name} requests.", retry_after=self._retry_after()
+            )
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._seq), future))
+        self._queued[priority] += 1
+        try:
+            await asyncio.wait_for(future, timeout=UPSTREAM_QUEUE_DEADLINES[name])
+        except asyncio.TimeoutError:
+            self._stats[name]["timed_out"] += 1
+            raise UpstreamOverloaded(
+                f"Timed out waiting for an upstream slot ({name}).", retry_after=self._retry_after()
+            )
+        except asyncio.CancelledError:
+            # A slot granted just before cancellation must be handed back
+            if future.done() and not future.cancelled():
+                self._active -= 1
+                self._dispatch()
+            raise
+        finally:
+            self._queued[priority] -= 1
+
+    def _dispatch(self):
+        """Grant free slots to the highest-priority waiters (skipping abandoned ones)."""
+        while self._waiters and self._active < int(self._limit):
+            _, _, future = heapq.heappop(self._waiters)
+            if future.done():
+                continue
+            self._active += 1
+            future.set_result(None)
+
+    def _on_success(self, priority: Priority, latency: float):
+        self._stats[priority.name.lower()]["completed"] += 1
+        self._avg_latency = 0.8 * self._avg_latency + 0.2 * latency
+        if latency > UPSTREAM_TARGET_LATENCY:
+            self._limit = max(UPSTREAM_MIN_CONCURRENCY, self._limit * 0.9)
+        else:
+            self._limit = min(UPSTREAM_MAX_CONCURRENCY, self._limit + 1 / self._limit)
+        self._dispatch()
+
+    def _retry_after(self) -> int:
+        """Rough seconds until queued work drains at the current limit."""
+        pending = sum(self._queued.values()) + self._active
+        return max(1, math.ceil(self._avg_latency * pending / max(1, int(self._limit))))
+
+    def stats(self) -> dict:
+        return {
+            "concurrency_limit": round(self._limit, 2),
+            "active": self._active,
+            "queued": {p.name.lower(): n for p, n in self._queued.items()},
+            "avg_latency_seconds": round(self._avg_latency, 3),
+            "priorities": {name: dict(counters) for name, counters in self._stats.items()},
+        }
+
+
+_scheduler = UpstreamScheduler()
+
+
+async def run_upstream(priority: Priority, fn: Callable[..., Any], *args, **kwargs) -> Any:
+    """Run a blocking upstream call through the shared scheduler."""
+    return await _scheduler.run(priority, fn, *args, **kwargs)
+
+
+def get_scheduler_stats() -> dict:
+    """Return current limits, queue depths and per-priority counters."""
+    return _scheduler.stats()
@@ -0,0 +1,61 @@
+"""
+Warmup service: initializes lazily-loaded subsystems ahead of the first request.
+Preloads the most recently used document indexes and opens upstream connections.
+"""
+
+import time
+
+from app.config import HF_INFERENCE_URL, WARMUP_DOCUMENTS
+
+
+_status = {
+    "ready": False,
+    "warmup_seconds": None,
+    "indexes_preloaded": 0,
+    "upstream_connected": False,
+}
+
+
+def warm_up(max_documents: int = WARMUP_DOCUMENTS) -> dict:
+    """
+    Run all warmup steps and mark the service ready. Failures in individual
+    steps are logged and skipped; they only mean the first request pays for them.
+    """
+    start = time.perf_counter()
+
+    from app.services.crypto_service import get_aes_key
+    from app.services.document_processor import preload_recent_indexes
+    from app.services.hf_client import get_hf_client
+
+    try:
+        get_aes_key()
+    except Exception as e:
+        print(f"[warmup] AES key load failed: {e}")
+
+    try:
+        _status["indexes_preloaded"] = preload_recent_indexes(max_documents)
+    except Exception as e:
+        print(f"[warmup] Index preload failed: {e}")
+
+    try:
+        from huggingface_hub.utils import get_session
+        get_hf_client()
+        # Establishes a pooled TLS connection for the first LLM/embedding call to reuse
+        get_session().head(HF_INFERENCE_URL, timeout=5)
+        _status["upstream_connected"] = True
+    except Exception as e:
+        print(f"[warmup] Upstream connection warmup failed: {e}")
+
+    _status["warmup_seconds"] = round(time.perf_counter() - start, 3)
+    _status["ready"] = True
+    return get_warmup_status()
+
+
+def mark_ready():
+    """Mark the service ready without warming up (everything loads on first use)."""
+    _status["ready"] = True
+
+
+def get_warmup_status() -> dict:
+    """Return a copy of the current warmup status."""
+    return dict(_status)
@@ -0,0 +1,81 @@
+"""
+Cold-start benchmark: measures `import app.main` time and time to the first
+served request in fresh interpreters, and checks that heavy subsystems stay lazy.
+Exits non-zero when a budget is exceeded, so it can gate CI.
+
+Usage (from backend/):
+    python -m app.tools.cold_start_benchmark --runs 5 --max-import-seconds 1.5
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+from app.config import BASE_DIR
+
+# Modules that must not be loaded just by importing the app
+LAZY_MODULES = ["faiss", "numpy", "langchain_text_splitters", "huggingface_hub"]
+
+_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import app.main
+imported = time.perf_counter() - start
+eager = [m for m in {lazy!r} if m in sys.modules]
+from fastapi.testclient import TestClient
+with TestClient(app.main.app) as client:
+    client.get("/health")
+    first_request = time.perf_counter() - start
+print(json.dumps({{"import": imported, "first_request": first_request, "eager": eager}}))
+"""
+
+
+def _run_probe() -> dict:
+    """Run one measurement in a fresh interpreter, with warmup disabled."""
+    env = {**os.environ, "WARMUP_ON_STARTUP": "false"}
+    output = subprocess.run(
+        [sys.executable, "-c", _PROBE.format(lazy=LAZY_MODULES)],
+        cwd=BASE_DIR,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--max-import-seconds", type=float, default=1.5)
+    parser.add_argument("--max-first-request-seconds", type=float, default=2.0)
+    args = parser.parse_args()
+
+    runs = [_run_probe() for _ in range(args.runs)]
+    import_times = [r["import"] for r in runs]
+    first_request_times = [r["first_request"] for r in runs]
+    eager = sorted({m for r in runs for m in r["eager"]})
+
+    print(f"Runs: {args.runs}")
+    print(f"import app.main   min {min(import_times):.3f}s  median {statistics.median(import_times):.3f}s")
+    print(f"first request     min {min(first_request_times):.3f}s  median {statistics.median(first_request_times):.3f}s")
+    print(f"eagerly imported: {', '.join(eager) if eager else 'none'}")
+
+    failures = []
+    if statistics.median(import_times) > args.max_import_seconds:
+        failures.append(f"import time exceeds {args.max_import_seconds}s budget")
+    if statistics.median(first_request_times) > args.max_first_request_seconds:
+        failures.append(f"first request exceeds {args.max_first_request_seconds}s budget")
+    if eager:
+        failures.append(f"heavy modules imported at startup: {', '.join(eager)}")
+
+    for failure in failures:
+        print(f"[FAIL] {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""
+Local sharded cluster: start several backend nodes on one machine, each with
+its own data directory, for trying out sharding, scatter-gather search and
+rebalancing without extra hardware.
+
+Usage (from backend/):
+    python -m app.tools.local_cluster --nodes 3 --base-port 8100
+
+Adding a node: stop the cluster, start it again with one more node (same
+--data-root), then run the rebalance tool on each of the old nodes, e.g.
+    DATA_DIR=<data-root>/node0 CLUSTER_SELF_URL=http://127.0.0.1:8100 \\
+    CLUSTER_NODES=... CLUSTER_TOKEN=... python -m app.tools.rebalance
+The exact environment for each node is printed at startup.
+"""
+
+import argparse
+import base64
+import os
+import secrets
+import signal
+import subprocess
+import sys
+from pathlib import Path
+
+from app.config import BASE_DIR
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--nodes", type=int, default=3)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--base-port", type=int, default=8100)
+    parser.add_argument("--data-root", default=str(BASE_DIR / "cluster_data"))
+    args = parser.parse_args()
+
+    urls = [f"http://{args.host}:{args.base_port + i}" for i in range(args.nodes)]
+    # Nodes must agree on the encryption key and the cluster token
+    shared_env = {
+        "CLUSTER_NODES": ",".join(urls),
+        "CLUSTER_TOKEN": os.getenv("CLUSTER_TOKEN") or secrets.token_urlsafe(24),
+        "AES_SECRET_KEY": os.getenv("AES_SECRET_KEY") or base64.b64encode(os.urandom(32)).decode(),
+    }
+
+    processes = []
+    for i, url in enumerate(urls):
+        data_dir = Path(args.data_root) / f"node{i}"
+        data_dir.mkdir(parents=True, exist_ok=True)
+        node_env = {**shared_env, "DATA_DIR": str(data_dir), "CLUSTER_SELF_URL": url}
+        print(f"[node{i}] {url}")
+        print("    " + " ".join(f"{k}={v}" for k, v in node_env.items()))
+        processes.append(subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "app.main:app",
+             "--host", args.host, "--port", str(args.base_port + i)],
+            cwd=BASE_DIR,
+            env={**os.environ, **node_env},
+        ))
+
+    try:
+        for process in processes:
+            process.wait()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for process in processes:
+            if process.poll() is None:
+                process.send_signal(signal.SIGINT)
+        for process in processes:
+            process.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+Cluster rebalancing: after nodes are added to (or removed from) CLUSTER_NODES,
+move every document stored on this node that the hash ring now assigns to
+another node. Each document is copied to its owner, then deleted locally.
+
+Run on each node, with the same environment as the server (CLUSTER_* settings):
+    python -m app.tools.rebalance --dry-run
+    python -m app.tools.rebalance
+"""
+
+import argparse
+import asyncio
+
+from app.config import CLUSTER_SELF_URL
+from app.services import cluster
+from app.services.document_processor import (
+    delete_document,
+    export_document_bundle,
+    get_document_status,
+    list_local_document_ids,
+)
+
+
+async def rebalance(dry_run: bool):
+    if not cluster.is_enabled():
+        print("Cluster mode is not enabled (set CLUSTER_NODES and CLUSTER_SELF_URL).")
+        return
+
+    moves = [
+        (document_id, cluster.owner_of(document_id))
+        for document_id in list_local_document_ids()
+        if not cluster.is_local(document_id)
+    ]
+    print(f"Node: {CLUSTER_SELF_URL}   ring: {', '.join(cluster.all_nodes())}")
+    print(f"Documents to move: {len(moves)}")
+    if dry_run:
+        for document_id, owner in moves:
+            print(f"[dry-run] {document_id} -> {owner}")
+        return
+
+    failures = 0
+    for document_id, owner in moves:
+        if get_document_status(document_id) != "ready":
+            print(f"[skip] {document_id}: still indexing, run again later")
+            failures += 1
+            continue
+        try:
+            bundle = export_document_bundle(document_id)
+            response = await cluster.forward(
+                owner,
+                "PUT",
+                f"/api/cluster/documents/{document_id}",
+                content=bundle,
+                headers={"Content-Type": "application/gzip"},
+            )
+        except (cluster.ShardUnavailable, OSError, ValueError) as e:
+            failures += 1
+            print(f"[error] {document_id}: {e}")
+            continue
+
+        # 409: the owner already has it (e.g. an earlier interrupted run)
+        if response.status_code in (200, 201, 409):
+            delete_document(document_id)
+            print(f"[ok] {document_id} -> {owner}")
+        else:
+            failures += 1
+            print(f"[error] {document_id}: {owner} answered HTTP {response.status_code}")
+
+    print(f"Done: {len(moves) - failures} moved, {failures} failed.")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+    asyncio.run(rebalance(args.dry_run))
+
+
+if __name__ == "__main__":
+    main()
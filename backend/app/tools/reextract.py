@@ -0,0 +1,75 @@
+"""
+Bulk re-extraction: re-run structured extraction for stored documents whose
+persisted result is missing or stale (document content, model or prompt changed).
+
+Usage (from backend/):
+    python -m app.tools.reextract --dry-run
+    python -m app.tools.reextract --concurrency 4
+    python -m app.tools.reextract --all
+"""
+
+import argparse
+import asyncio
+
+from app.config import VECTOR_STORE_DIR, LLM_MODEL_ID
+from app.services.document_processor import get_document_status
+from app.services.extraction_service import (
+    EXTRACTION_PROMPT_VERSION,
+    extract_shipment_data,
+    extraction_cache_key,
+    load_stored_extraction,
+)
+
+
+def _list_document_ids() -> list[str]:
+    """Documents that own stored artifacts (aliases share them) and are fully indexed."""
+    return sorted(
+        d.name for d in VECTOR_STORE_DIR.iterdir()
+        if d.is_dir() and (d / "index.faiss").exists() and get_document_status(d.name) == "ready"
+    )
+
+
+def _needs_extraction(document_id: str) -> bool:
+    stored = load_stored_extraction(document_id)
+    return stored is None or stored.get("key") != extraction_cache_key(document_id)
+
+
+async def reextract(force: bool, dry_run: bool, concurrency: int):
+    document_ids = [
+        d for d in _list_document_ids() if force or _needs_extraction(d)
+    ]
+    print(f"Model: {LLM_MODEL_ID}   prompt version: {EXTRACTION_PROMPT_VERSION}")
+    print(f"Documents to extract: {len(document_ids)}")
+    if dry_run:
+        for document_id in document_ids:
+            print(f"[dry-run] {document_id}")
+        return
+
+    semaphore = asyncio.Semaphore(concurrency)
+    failures = 0
+
+    async def run(document_id: str):
+        nonlocal failures
+        async with semaphore:
+            try:
+                result = await extract_shipment_data(document_id, refresh=True)
+                print(f"[ok] {document_id}: confidence {result['confidence']}")
+            except Exception as e:
+                failures += 1
+                print(f"[error] {document_id}: {e}")
+
+    await asyncio.gather(*(run(d) for d in document_ids))
+    print(f"Done: {len(document_ids) - failures} extracted, {failures} failed.")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--all", action="store_true", help="Re-extract even up-to-date results")
+    parser.add_argument("--dry-run", action="store_true")
+    parser.add_argument("--concurrency", type=int, default=4)
+    args = parser.parse_args()
+    asyncio.run(reextract(args.all, args.dry_run, args.concurrency))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+"""
+Vector compression tool: report the disk/recall tradeoff of each compression
+mode on stored documents, and re-encode existing index.faiss files in place.
+Sizes include the fp16 re-rank vectors (vectors.npy) kept for int8/PQ indexes.
+
+Usage (from backend/):
+    python -m app.tools.vector_compression report --sample 50
+    python -m app.tools.vector_compression reencode --compression int8
+"""
+
+import argparse
+import os
+import random
+
+import numpy as np
+import faiss
+
+from app.config import VECTOR_STORE_DIR, RERANK_CANDIDATES_FACTOR
+from app.services.document_processor import (
+    _build_faiss_index,
+    _load_float_vectors,
+    _needs_rerank_vectors,
+    get_document_status,
+)
+
+COMPRESSION_MODES = ["none", "fp16", "int8", "pq"]
+
+
+def _list_document_ids() -> list[str]:
+    """All document ids with a stored index."""
+    return sorted(
+        d.name for d in VECTOR_STORE_DIR.iterdir()
+        if d.is_dir() and (d / "index.faiss").exists()
+    )
+
+
+def _recall(exact_ids: np.ndarray, approx_ids: np.ndarray) -> float:
+    """Mean fraction of the exact top-k found in the approximate top-k."""
+    hits = [len(set(e) & set(a)) / len(e) for e, a in zip(exact_ids, approx_ids)]
+    return float(np.mean(hits))
+
+
+def report(sample: int, top_k: int, seed: int = 0):
+    """
+    Print on-disk size (index + re-rank vectors) and recall@k for every compression
+    mode over a sample of documents. Each document's own chunk vectors serve as the query set.
+    """
+    document_ids = _list_document_ids()
+    random.Random(seed).shuffle(document_ids)
+
+    totals = {mode: {"bytes": 0, "recall": [], "recall_reranked": []} for mode in COMPRESSION_MODES}
+    measured = 0
+    for document_id in document_ids:
+        if measured >= sample:
+            break
+        vectors = _load_float_vectors(document_id)
+        if vectors is None or len(vectors) == 0:
+            print(f"[skip] {document_id}: no float32 vectors available")
+            continue
+        measured += 1
+
+        k = min(top_k, len(vectors))
+        num_candidates = min(k * RERANK_CANDIDATES_FACTOR, len(vectors))
+        _, exact_ids = _build_faiss_index(vectors, "none").search(vectors, k)
+
+        # Re-ranking uses the vectors as stored: fp16
+        rerank_vectors = vectors.astype(np.float16).astype(np.float32)
+
+        for mode in COMPRESSION_MODES:
+            index = _build_faiss_index(vectors, mode)
+            totals[mode]["bytes"] += faiss.serialize_index(index).nbytes
+            reranks = _needs_rerank_vectors(index)
+            if reranks:
+                totals[mode]["bytes"] += rerank_vectors.size * 2
+
+            _, approx_ids = index.search(vectors, num_candidates)
+            totals[mode]["recall"].append(_recall(exact_ids, approx_ids[:, :k]))
+            if not reranks:
+                totals[mode]["recall_reranked"].append(totals[mode]["recall"][-1])
+                continue
+
+            exact_scores = np.einsum("qd,qcd->qc", vectors, rerank_vectors[approx_ids])
+            reranked = np.take_along_axis(approx_ids, np.argsort(-exact_scores, axis=1), axis=1)
+            totals[mode]["recall_reranked"].append(_recall(exact_ids, reranked[:, :k]))
+
+    if not measured:
+        print("No documents with recoverable float32 vectors found.")
+        return
+
+    baseline = totals["none"]["bytes"]
+    print(f"\nDocuments sampled: {measured}   recall@{top_k}")
+    print(f"{'mode':<6} {'disk bytes':>14} {'vs float32':>11} {'recall':>8} {'reranked':>9}")
+    for mode, t in totals.items():
+        print(
+            f"{mode:<6} {t['bytes']:>14,} {t['bytes'] / baseline:>10.1%} "
+            f"{np.mean(t['recall']):>8.3f} {np.mean(t['recall_reranked']):>9.3f}"
+        )
+
+
+def _disk_size(doc_dir) -> int:
+    """Bytes of a document's index plus its re-rank vectors, if any."""
+    return sum(
+        (doc_dir / name).stat().st_size
+        for name in ("index.faiss", "vectors.npy")
+        if (doc_dir / name).exists()
+    )
+
+
+def reencode(compression: str, document_ids: list[str], dry_run: bool = False):
+    """Rebuild each document's index.faiss with the given compression, replacing it atomically."""
+    for document_id in document_ids or _list_document_ids():
+        doc_dir = VECTOR_STORE_DIR / document_id
+        if get_document_status(document_id) == "indexing":
+            print(f"[skip] {document_id}: still being indexed")
+            continue
+        vectors = _load_float_vectors(document_id)
+        if vectors is None:
+            print(f"[skip] {document_id}: index is compressed and has no vectors.npy")
+            continue
+
+        old_size = _disk_size(doc_dir)
+        index = _build_faiss_index(vectors, compression)
+        if dry_run:
+            new_size = faiss.serialize_index(index).nbytes
+            if _needs_rerank_vectors(index):
+                new_size += vectors.size * 2
+            print(f"[dry-run] {document_id}: {old_size:,} -> {new_size:,} bytes")
+            continue
+
+        vectors_path = doc_dir / "vectors.npy"
+        if _needs_rerank_vectors(index):
+            # Replaced atomically: running workers may have the old file memory-mapped
+            with open(doc_dir / "vectors.npy.tmp", "wb") as f:
+                np.save(f, vectors.astype(np.float16))
+            os.replace(doc_dir / "vectors.npy.tmp", vectors_path)
+        else:
+            # Flat and fp16 indexes are (near) exact and can be decoded; no re-rank vectors needed
+            vectors_path.unlink(missing_ok=True)
+
+        tmp_path = doc_dir / "index.faiss.tmp"
+        faiss.write_index(index, str(tmp_path))
+        os.replace(tmp_path, doc_dir / "index.faiss")
+        new_size = _disk_size(doc_dir)
+        print(f"[ok] {document_id}: {old_size:,} -> {new_size:,} bytes")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    report_parser = subparsers.add_parser("report", help="Report memory/recall tradeoff")
+    report_parser.add_argument("--sample", type=int, default=50, help="Documents to sample")
+    report_parser.add_argument("--top-k", type=int, default=5)
+    report_parser.add_argument("--seed", type=int, default=0)
+
+    reencode_parser = subparsers.add_parser("reencode", help="Re-encode stored indexes in place")
+    reencode_parser.add_argument("--compression", choices=COMPRESSION_MODES, required=True)
+    reencode_parser.add_argument("--document-id", action="append", default=[], dest="document_ids")
+    reencode_parser.add_argument("--dry-run", action="store_true")
+
+    args = parser.parse_args()
+    if args.command == "report":
+        report(args.sample, args.top_k, args.seed)
+    else:
+        reencode(args.compression, args.document_ids, args.dry_run)
+
+
+if __name__ == "__main__":
+    main()
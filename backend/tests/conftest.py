@@ -0,0 +1,32 @@
+"""Shared test setup: isolated data directory and fake embeddings (no network)."""
+
+import base64
+import hashlib
+import os
+import tempfile
+
+# Must be set before app.config is imported
+os.environ.setdefault("DATA_DIR", tempfile.mkdtemp(prefix="doc-intel-tests-"))
+os.environ.setdefault("AES_SECRET_KEY", base64.b64encode(b"0" * 32).decode())
+os.environ.setdefault("WARMUP_ON_STARTUP", "false")
+
+import numpy as np
+import pytest
+
+
+def fake_embeddings(texts: list[str]) -> np.ndarray:
+    """Deterministic bag-of-words vectors, normalized like the real embeddings."""
+    vectors = np.zeros((len(texts), 64), dtype=np.float32)
+    for row, text in enumerate(texts):
+        for word in text.lower().split():
+            vectors[row, int(hashlib.md5(word.encode()).hexdigest(), 16) % 64] += 1
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1
+    return vectors / norms
+
+
+@pytest.fixture
+def fake_embed(monkeypatch):
+    from app.services import document_processor
+    monkeypatch.setattr(document_processor, "_get_embeddings", fake_embeddings)
+    return fake_embeddings
@@ -0,0 +1,54 @@
+"""Tests for consistent-hash placement of documents across cluster nodes."""
+
+import uuid
+from collections import Counter
+
+from app.services.cluster import HashRing, config_errors
+
+
+NODES = ["http://node-a:8000", "http://node-b:8000", "http://node-c:8000"]
+KEYS = [str(uuid.UUID(int=i)) for i in range(3000)]
+
+
+def test_owner_is_deterministic_and_independent_of_node_order():
+    ring = HashRing(NODES)
+    shuffled = HashRing(list(reversed(NODES)))
+    assert all(ring.owner(k) == shuffled.owner(k) == ring.owner(k) for k in KEYS)
+
+
+def test_keys_are_spread_over_all_nodes():
+    counts = Counter(HashRing(NODES).owner(k) for k in KEYS)
+    assert set(counts) == set(NODES)
+    assert min(counts.values()) > len(KEYS) / len(NODES) * 0.6
+
+
+def test_adding_a_node_only_moves_keys_to_the_new_node():
+    before = HashRing(NODES)
+    after = HashRing(NODES + ["http://node-d:8000"])
+
+    moved = [k for k in KEYS if before.owner(k) != after.owner(k)]
+    assert all(after.owner(k) == "http://node-d:8000" for k in moved)
+    # Roughly 1/4 of the keys move to the fourth node; the rest keep their owner
+    assert 0.15 < len(moved) / len(KEYS) < 0.35
+
+
+def test_removing_a_node_only_moves_its_keys():
+    before = HashRing(NODES)
+    after = HashRing(NODES[:2])
+    for k in KEYS:
+        if before.owner(k) != NODES[2]:
+            assert after.owner(k) == before.owner(k)
+
+
+def test_single_node_without_cluster_settings_is_valid():
+    assert config_errors([], "", "") == []
+
+
+def test_cluster_without_token_is_invalid():
+    assert config_errors(NODES, NODES[0], "") != []
+    assert config_errors(NODES, NODES[0], "secret") == []
+
+
+def test_self_url_must_be_one_of_the_nodes():
+    assert config_errors(NODES, "http://node-z:8000", "secret") != []
+    assert config_errors(NODES, "", "secret") != []
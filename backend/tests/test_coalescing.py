@@ -0,0 +1,115 @@
+"""Tests for single-flight coalescing of identical in-flight ask/extract calls."""
+
+import asyncio
+
+import pytest
+
+from app.services import coalescing
+from app.services.coalescing import coalesce, normalize_question
+
+
+@pytest.fixture(autouse=True)
+def fresh_state(monkeypatch):
+    monkeypatch.setattr(coalescing, "_in_flight", {})
+    monkeypatch.setattr(coalescing, "_stats", {})
+
+
+def _slow_factory(calls: list, result="answer", delay=0.05):
+    async def factory():
+        calls.append(1)
+        await asyncio.sleep(delay)
+        return result
+    return factory
+
+
+async def test_concurrent_identical_calls_run_factory_once():
+    calls = []
+    factory = _slow_factory(calls)
+    results = await asyncio.gather(*(coalesce("ask", "doc", "Who is the carrier?", factory) for _ in range(5)))
+
+    assert results == ["answer"] * 5
+    assert len(calls) == 1
+    assert coalescing.get_coalescing_stats()["operations"]["ask"] == {"executed": 1, "coalesced": 4}
+    assert coalescing.get_coalescing_stats()["in_flight"] == 0
+
+
+async def test_exception_reaches_every_waiter():
+    calls = []
+
+    async def failing():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        raise RuntimeError("upstream error")
+
+    results = await asyncio.gather(
+        *(coalesce("ask", "doc", "q", failing) for _ in range(3)), return_exceptions=True
+    )
+    assert len(calls) == 1
+    assert all(isinstance(r, RuntimeError) and str(r) == "upstream error" for r in results)
+
+    # A failed call is not cached: the next one runs again
+    await coalesce("ask", "doc", "q", _slow_factory(calls, delay=0))
+    assert len(calls) == 2
+
+
+async def test_cancelled_caller_does_not_cancel_the_shared_call():
+    calls = []
+    factory = _slow_factory(calls, delay=0.1)
+    leaving = asyncio.create_task(coalesce("ask", "doc", "q", factory))
+    staying = asyncio.create_task(coalesce("ask", "doc", "q", factory))
+    await asyncio.sleep(0.02)
+
+    leaving.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await leaving
+    assert await staying == "answer"
+    assert len(calls) == 1
+
+
+async def test_question_variants_share_a_key():
+    variants = ["Who is the carrier?", "  who is   THE carrier ", "Who is the carrier."]
+    assert len({normalize_question(q) for q in variants}) == 1
+
+    calls = []
+    factory = _slow_factory(calls)
+    await asyncio.gather(*(coalesce("ask", "doc", q, factory) for q in variants))
+    assert len(calls) == 1
+
+
+async def test_different_documents_and_operations_do_not_share_calls():
+    calls = []
+    factory = _slow_factory(calls)
+    await asyncio.gather(
+        coalesce("ask", "doc-1", "q", factory),
+        coalesce("ask", "doc-2", "q", factory),
+        coalesce("extract", "doc-1", "q", factory),
+    )
+    assert len(calls) == 3
+
+
+async def test_refresh_and_cached_extracts_are_not_coalesced(monkeypatch):
+    import httpx
+
+    from app.main import app
+    from app.routers import documents
+
+    refresh_flags = []
+
+    async def extract_shipment_data(document_id, refresh=False):
+        refresh_flags.append(refresh)
+        await asyncio.sleep(0.05)
+        return {"data": {"carrier_name": "FastTrucks Inc"}, "confidence": 0.9, "cached": not refresh}
+
+    monkeypatch.setattr(documents, "document_exists", lambda document_id: True)
+    monkeypatch.setattr(documents, "get_document_status", lambda document_id: "ready")
+    monkeypatch.setattr(documents, "extract_shipment_data", extract_shipment_data)
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        responses = await asyncio.gather(*(
+            client.post("/api/extract", json={"document_id": "doc", "refresh": refresh})
+            for refresh in (False, False, True, True)
+        ))
+
+    assert [r.json()["cached"] for r in responses] == [True, True, False, False]
+    assert sorted(refresh_flags) == [False, True]
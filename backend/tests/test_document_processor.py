@@ -0,0 +1,282 @@
+"""Tests for document ingestion, storage and search."""
+
+import asyncio
+
+import pytest
+
+from app.services import document_processor
+from app.services.scheduler import UpstreamOverloaded
+
+
+def _text_document(paragraphs: int) -> bytes:
+    return "\n\n".join(
+        f"Section {i}. Shipment {i} carries pallets of item {i} from warehouse {i % 7} "
+        f"to store {i % 11}. " * 6
+        for i in range(paragraphs)
+    ).encode("utf-8")
+
+
+async def _finish_background_ingestion():
+    while document_processor._background_ingestions:
+        await asyncio.gather(*document_processor._background_ingestions, return_exceptions=True)
+
+
+async def test_background_ingestion_gives_up_when_upstream_stays_overloaded(monkeypatch, fake_embed):
+    monkeypatch.setattr(document_processor, "EMBED_BATCH_SIZE", 2)
+    monkeypatch.setattr(document_processor, "INGEST_MAX_RETRIES", 3)
+    calls = 0
+
+    async def run_upstream(priority, fn, *args, **kwargs):
+        nonlocal calls
+        calls += 1
+        if calls > 1:
+            await asyncio.sleep(0.05)  # Let the first batch reach the index
+            raise UpstreamOverloaded("busy", retry_after=0)
+        return fn(*args, **kwargs)
+
+    monkeypatch.setattr(document_processor, "run_upstream", run_upstream)
+    result = await document_processor.process_document(_text_document(20), "overloaded.txt")
+    assert result["status"] == "indexing"
+
+    await _finish_background_ingestion()
+    assert document_processor.get_document_status(result["document_id"]) == "failed"
+    assert calls == 1 + 3 + 1  # first batch, then the initial try and 3 retries
+
+
+def _write_stale_indexing_document(document_id: str):
+    import json
+    doc_dir = document_processor.VECTOR_STORE_DIR / document_id
+    doc_dir.mkdir(parents=True)
+    (doc_dir / "meta.json").write_text(json.dumps({
+        "filename": "interrupted.txt", "num_chunks": 3, "file_ext": ".txt", "status": "indexing",
+    }))
+
+
+def test_indexing_document_without_live_pipeline_is_marked_failed():
+    import uuid
+    document_id = str(uuid.uuid4())
+    _write_stale_indexing_document(document_id)
+
+    assert document_processor.get_document_status(document_id) == "failed"
+    assert document_processor.get_document_info(document_id)["status"] == "failed"
+
+
+def test_indexing_document_with_fresh_heartbeat_stays_indexing():
+    import uuid
+    document_id = str(uuid.uuid4())
+    _write_stale_indexing_document(document_id)
+    (document_processor.VECTOR_STORE_DIR / document_id / "ingest.heartbeat").touch()
+
+    assert document_processor.get_document_status(document_id) == "indexing"
+
+
+async def test_progressive_ingestion_finishes_ready(monkeypatch, fake_embed):
+    monkeypatch.setattr(document_processor, "EMBED_BATCH_SIZE", 2)
+    result = await document_processor.process_document(_text_document(20), "complete.txt")
+    await _finish_background_ingestion()
+
+    doc_dir = document_processor.VECTOR_STORE_DIR / result["document_id"]
+    assert document_processor.get_document_status(result["document_id"]) == "ready"
+    assert not (doc_dir / "ingest.heartbeat").exists()
+
+
+async def test_progressive_ingestion_saves_index_logarithmically(monkeypatch, fake_embed):
+    monkeypatch.setattr(document_processor, "EMBED_BATCH_SIZE", 1)
+    monkeypatch.setattr(document_processor, "PROGRESSIVE_INGESTION", False)
+    saved_sizes = []
+    original_save = document_processor._save_faiss_index
+
+    def recording_save(document_id, index, chunks, embeddings=None):
+        saved_sizes.append(len(chunks))
+        original_save(document_id, index, chunks, embeddings)
+
+    monkeypatch.setattr(document_processor, "_save_faiss_index", recording_save)
+    result = await document_processor.process_document(_text_document(120), "long.txt")
+
+    num_chunks = result["num_chunks"]
+    assert num_chunks > 30
+    assert saved_sizes[0] == 1 and saved_sizes[-1] == num_chunks
+    assert len(saved_sizes) <= num_chunks.bit_length() + 2
+    assert sum(saved_sizes) <= 3 * num_chunks
+    _, chunks = document_processor._load_faiss_index(result["document_id"])
+    assert len(chunks) == num_chunks
+
+
+async def test_corpus_search_leaves_index_cache_and_recency_alone(monkeypatch, fake_embed):
+    import os
+
+    monkeypatch.setattr(document_processor, "PROGRESSIVE_INGESTION", False)
+    document_ids = []
+    for i in range(3):
+        result = await document_processor.process_document(_text_document(3 + i), f"corpus{i}.txt")
+        document_ids.append(result["document_id"])
+
+    document_processor._index_cache.clear()
+    document_processor.search_similar_chunks(document_ids[0], "pallets", top_k=2)
+    cache_before = list(document_processor._index_cache)
+    mtimes_before = {
+        d.name: d.stat().st_mtime_ns for d in document_processor.VECTOR_STORE_DIR.iterdir()
+    }
+
+    query = fake_embed(["shipment pallets warehouse"])[0]
+    results = document_processor.search_all_documents(query, top_k=5)
+
+    assert len(results) == 5
+    assert {r["document_id"] for r in results} <= set(os.listdir(document_processor.VECTOR_STORE_DIR))
+    assert list(document_processor._index_cache) == cache_before
+    assert {
+        d.name: d.stat().st_mtime_ns for d in document_processor.VECTOR_STORE_DIR.iterdir()
+    } == mtimes_before
+
+
+def _unique_text_document(paragraphs: int) -> bytes:
+    import uuid
+    return _text_document(paragraphs) + f"\n\nReference {uuid.uuid4()}".encode("utf-8")
+
+
+async def test_corpus_search_reads_only_changed_documents(monkeypatch, fake_embed):
+    monkeypatch.setattr(document_processor, "PROGRESSIVE_INGESTION", False)
+    loaded = []
+    load = document_processor._load_corpus_vectors
+    monkeypatch.setattr(
+        document_processor, "_load_corpus_vectors", lambda a: loaded.append(a) or load(a)
+    )
+    query = fake_embed(["shipment pallets warehouse"])[0]
+
+    first = (await document_processor.process_document(_unique_text_document(4), "aggregate1.txt"))["document_id"]
+    document_processor.search_all_documents(query, top_k=5)
+    loaded.clear()
+    document_processor.search_all_documents(query, top_k=5)
+    assert loaded == []
+
+    second = (await document_processor.process_document(_unique_text_document(5), "aggregate2.txt"))["document_id"]
+    results = document_processor.search_all_documents(query, top_k=1000)
+    assert loaded == [second]
+    assert {first, second} <= {r["document_id"] for r in results}
+
+    document_processor.delete_document(first)
+    results = document_processor.search_all_documents(query, top_k=1000)
+    assert first not in {r["document_id"] for r in results}
+
+
+async def test_corpus_search_includes_documents_without_metadata(monkeypatch, fake_embed):
+    monkeypatch.setattr(document_processor, "PROGRESSIVE_INGESTION", False)
+    result = await document_processor.process_document(_unique_text_document(3), "nometa.txt")
+    (document_processor.VECTOR_STORE_DIR / result["document_id"] / "meta.json").unlink()
+    document_processor._mark_corpus_changed()
+
+    query = fake_embed(["shipment pallets warehouse"])[0]
+    results = document_processor.search_all_documents(query, top_k=1000)
+    hits = [r for r in results if r["document_id"] == result["document_id"]]
+    assert len(hits) == result["num_chunks"]
+    assert all(r["filename"] == "" for r in hits)
+
+
+def test_compressed_index_with_rerank_vectors_is_smaller_than_float32():
+    import numpy as np
+
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((200, 384)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+
+    sizes = {}
+    for compression in ("none", "int8"):
+        document_id = f"compression-{compression}"
+        index = document_processor._build_faiss_index(vectors, compression)
+        document_processor._save_faiss_index(document_id, index, ["chunk"] * 200, vectors)
+        doc_dir = document_processor.VECTOR_STORE_DIR / document_id
+        sizes[compression] = sum(
+            (doc_dir / name).stat().st_size for name in ("index.faiss", "vectors.npy")
+            if (doc_dir / name).exists()
+        )
+
+    assert np.load(document_processor.VECTOR_STORE_DIR / "compression-int8" / "vectors.npy").dtype == np.float16
+    assert not (document_processor.VECTOR_STORE_DIR / "compression-none" / "vectors.npy").exists()
+    assert sizes["int8"] < 0.8 * sizes["none"]
+
+
+def test_reencode_replaces_vectors_without_touching_mapped_file():
+    import os
+
+    import numpy as np
+
+    from app.tools.vector_compression import reencode
+
+    rng = np.random.default_rng(1)
+    vectors = rng.standard_normal((50, 64)).astype(np.float32)
+    document_id = "reencode-int8"
+    index = document_processor._build_faiss_index(vectors, "int8")
+    document_processor._save_faiss_index(document_id, index, ["chunk"] * 50, vectors)
+    vectors_path = document_processor.VECTOR_STORE_DIR / document_id / "vectors.npy"
+
+    mapped = np.load(vectors_path, mmap_mode="r")  # As a serving worker holds it
+    inode_before = os.stat(vectors_path).st_ino
+    reencode("int8", [document_id])
+
+    assert os.stat(vectors_path).st_ino != inode_before
+    assert np.array_equal(mapped, vectors.astype(np.float16))
+
+
+async def test_deleting_a_document_without_recorded_extension_removes_its_upload(monkeypatch, fake_embed):
+    import json
+
+    monkeypatch.setattr(document_processor, "PROGRESSIVE_INGESTION", False)
+    result = await document_processor.process_document(_unique_text_document(2), "legacy.txt")
+    document_id = result["document_id"]
+    meta_path = document_processor.VECTOR_STORE_DIR / document_id / "meta.json"
+    meta = json.loads(meta_path.read_text())
+    del meta["file_ext"]  # As stored before file_ext was recorded
+    meta_path.write_text(json.dumps(meta))
+    document_processor._document_store.pop(document_id, None)
+
+    assert list(document_processor.UPLOAD_DIR.glob(f"{document_id}*"))
+    assert document_processor.delete_document(document_id)
+    assert not list(document_processor.UPLOAD_DIR.glob(f"{document_id}*"))
+
+
+async def test_deleted_alias_is_not_served_from_another_workers_cache(monkeypatch, fake_embed):
+    import shutil
+    import uuid
+
+    monkeypatch.setattr(document_processor, "PROGRESSIVE_INGESTION", False)
+    content = f"Carrier: FastTrucks Inc\nReference {uuid.uuid4()}\n".encode()
+    original = await document_processor.process_document(content, "original.txt")
+    duplicate = await document_processor.process_document(content, "copy.txt")
+    alias_id = duplicate["document_id"]
+    assert duplicate["deduplicated"]
+    assert document_processor.document_exists(alias_id)  # Cached in this process now
+
+    # Another worker deletes the alias: only the files change, not this process's cache
+    shutil.rmtree(document_processor.VECTOR_STORE_DIR / alias_id)
+
+    assert not document_processor.document_exists(alias_id)
+    assert document_processor.document_exists(original["document_id"])
+
+
+async def test_shared_artifacts_are_removed_with_the_last_reference(monkeypatch, fake_embed):
+    import uuid
+
+    monkeypatch.setattr(document_processor, "PROGRESSIVE_INGESTION", False)
+    content = f"Weight: 42,000 lbs\nReference {uuid.uuid4()}\n".encode()
+    original = (await document_processor.process_document(content, "bol.txt"))["document_id"]
+    copy_1 = (await document_processor.process_document(content, "bol (1).txt"))["document_id"]
+    copy_2 = (await document_processor.process_document(content, "bol (2).txt"))["document_id"]
+    artifact_dir = document_processor.VECTOR_STORE_DIR / original
+
+    # Deleting the original hides it but keeps the artifacts its copies use
+    assert document_processor.delete_document(original)
+    assert not document_processor.document_exists(original)
+    assert document_processor.document_exists(copy_1)
+    assert document_processor.search_similar_chunks(copy_1, "weight", top_k=1)
+    assert not document_processor.delete_document(original)
+
+    assert document_processor.delete_document(copy_1)
+    assert artifact_dir.exists()
+
+    assert document_processor.delete_document(copy_2)
+    assert not artifact_dir.exists()
+    assert not document_processor.document_exists(copy_2)
+
+    # The content is no longer registered, so the same bytes are processed from scratch
+    again = await document_processor.process_document(content, "bol.txt")
+    assert not again["deduplicated"]
@@ -0,0 +1,36 @@
+"""API tests for the documents router."""
+
+import uuid
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.routers import documents
+
+
+@pytest.fixture
+def client(monkeypatch, fake_embed):
+    from app.services import document_processor
+
+    async def no_suggestions(document_id):
+        return []
+
+    monkeypatch.setattr(document_processor, "PROGRESSIVE_INGESTION", False)
+    monkeypatch.setattr(documents, "generate_suggested_questions", no_suggestions)
+    with TestClient(app) as test_client:
+        yield test_client
+
+
+def test_duplicate_upload_never_exposes_the_original_document_id(client):
+    content = f"Carrier: FastTrucks Inc\nReference {uuid.uuid4()}\n".encode()
+    first = client.post("/api/upload", files={"file": ("bol.txt", content, "text/plain")}).json()
+    second = client.post("/api/upload", files={"file": ("copy.txt", content, "text/plain")}).json()
+
+    assert second["deduplicated"] is True
+    assert second["document_id"] != first["document_id"]
+    assert first["document_id"] not in str(second)
+
+    # The second uploader deleting their document leaves the first one intact
+    assert client.delete(f"/api/documents/{second['document_id']}").status_code == 200
+    assert client.get(f"/api/documents/{first['document_id']}/status").status_code == 200
@@ -0,0 +1,52 @@
+"""Tests for persisted structured extraction."""
+
+import json
+import uuid
+from types import SimpleNamespace
+
+import pytest
+
+from app.services import document_processor, extraction_service
+
+
+def _completion(content: str):
+    return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+
+@pytest.fixture
+async def document_id(monkeypatch, fake_embed):
+    monkeypatch.setattr(document_processor, "PROGRESSIVE_INGESTION", False)
+    text = f"Carrier: FastTrucks Inc\nWeight: 42,000 lbs\nReference: {uuid.uuid4()}\n".encode()
+    result = await document_processor.process_document(text, "rate_confirmation.txt")
+    return result["document_id"]
+
+
+def _fake_llm(monkeypatch, replies: list):
+    async def run_upstream(priority, fn, *args, **kwargs):
+        return _completion(replies.pop(0))
+    monkeypatch.setattr(extraction_service, "run_upstream", run_upstream)
+
+
+async def test_extraction_is_stored_and_served_from_cache(monkeypatch, document_id):
+    _fake_llm(monkeypatch, [json.dumps({"carrier_name": "FastTrucks Inc", "confidence": 0.9})])
+
+    first = await extraction_service.extract_shipment_data(document_id)
+    second = await extraction_service.extract_shipment_data(document_id)
+
+    assert first["cached"] is False and second["cached"] is True
+    assert second["data"]["carrier_name"] == "FastTrucks Inc"
+
+
+async def test_unparseable_reply_is_not_cached(monkeypatch, document_id):
+    _fake_llm(monkeypatch, [
+        "Sorry, I cannot help with that.",
+        json.dumps({"carrier_name": "FastTrucks Inc", "confidence": 0.9}),
+    ])
+
+    failed = await extraction_service.extract_shipment_data(document_id)
+    assert failed["data"]["carrier_name"] is None
+    assert extraction_service.load_stored_extraction(document_id) is None
+
+    retried = await extraction_service.extract_shipment_data(document_id)
+    assert retried["cached"] is False
+    assert retried["data"]["carrier_name"] == "FastTrucks Inc"
@@ -0,0 +1,80 @@
+"""Tests for the extractive fast path (direct field lookups without an LLM call)."""
+
+import pytest
+
+from app.services.extractive_service import _match_field, extract_direct_answer
+
+
+CHUNK = (
+    "Shipper: ACME Corp   Consignee: Beta LLC\n"
+    "Carrier: FastTrucks Inc   Carrier MC Number: 123456\n"
+    "Shipper Address: 1 Main St, Dallas TX\n"
+    "Consignee Phone: 555-0100\n"
+    "Weight: 42,000 lbs\n"
+    "Rate: $2,500.00 USD\n"
+)
+
+
+@pytest.mark.parametrize("question, field", [
+    ("What is the weight?", "weight"),
+    ("Who is the carrier?", "carrier_name"),
+    ("who is the shipper", "shipper"),
+    ("What's the consignee name?", "consignee"),
+    ("What is the rate for this load?", "rate"),
+    ("What is the pickup date and time?", "pickup_datetime"),
+    ("What is the shipment ID?", "shipment_id"),
+])
+def test_direct_lookups_match_their_field(question, field):
+    assert _match_field(question) == field
+
+
+@pytest.mark.parametrize("question", [
+    "What is the carrier MC number?",
+    "What is the consignee phone number?",
+    "What is the shipper address?",
+    "What is the BOL number?",
+    "Who is the carrier and what is the rate?",
+    "Why is the weight so high?",
+    "What is the weight of the second pallet?",
+])
+def test_near_miss_questions_are_not_direct_lookups(question):
+    assert _match_field(question) is None
+    assert extract_direct_answer(question, [{"text": CHUNK, "score": 0.9}]) is None
+
+
+@pytest.mark.parametrize("question, text", [
+    ("What is the pickup date?", "Pickup: 1200 Industrial Pkwy, Dallas TX 75201"),
+    ("What is the delivery date?", "Drop-off: Dock 4, 55 Harbor Rd"),
+    ("What is the delivery date?", "Delivery Date: Dock 4, 55 Harbor Rd"),
+])
+def test_addresses_are_not_returned_as_datetimes(question, text):
+    assert extract_direct_answer(question, [{"text": text, "score": 0.9}]) is None
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("Pickup Date: 03/14/2025 08:00", "03/14/2025 08:00"),
+    ("Delivery Date/Time: March 16, 2025 2 PM", "March 16, 2025 2 PM"),
+    ("Drop-off time: 14:30", "14:30"),
+])
+def test_datetime_values_are_extracted(text, expected):
+    question = "What is the pickup date?" if text.startswith("Pickup") else "What is the delivery date?"
+    assert extract_direct_answer(question, [{"text": text, "score": 0.9}])["answer"] == expected
+
+
+def test_extracts_labeled_value_cut_at_next_label():
+    result = extract_direct_answer("Who is the carrier?", [{"text": CHUNK, "score": 0.9}])
+    assert result["answer"] == "FastTrucks Inc"
+    assert result["confidence"] >= 0.85
+
+    result = extract_direct_answer("Who is the shipper?", [{"text": CHUNK, "score": 0.9}])
+    assert result["answer"] == "ACME Corp"
+
+
+def test_conflicting_values_lower_confidence():
+    results = [
+        {"text": "Weight: 42,000 lbs", "score": 0.9},
+        {"text": "Weight: 38,500 lbs", "score": 0.8},
+    ]
+    result = extract_direct_answer("What is the weight?", results)
+    assert result["answer"] == "42,000 lbs"
+    assert result["confidence"] < 0.85
@@ -0,0 +1,215 @@
+"""Tests for how RAG answers combine retrieval, the extractive fast path and the LLM."""
+
+import json
+import re
+
+from app.services import rag_service
+
+
+def _batch_reply(user_prompt: str, skip: tuple = ()) -> str:
+    """Answer every [Qn] line of a combined prompt, except the question numbers in skip."""
+    ids = [int(n) for n in re.findall(r"^\[Q(\d+)\]", user_prompt, re.MULTILINE)]
+    return json.dumps([
+        {"id": n, "answer": f"answer {n}", "confidence": 0.9} for n in ids if n not in skip
+    ])
+
+
+def _fake_llm(calls: list):
+    async def run_upstream(priority, fn, *args, **kwargs):
+        calls.append(args)
+        return json.dumps({"answer": "from llm", "confidence": 0.9})
+    return run_upstream
+
+
+async def test_strong_retrieval_uses_extractive_answer(monkeypatch):
+    calls = []
+    monkeypatch.setattr(rag_service, "run_upstream", _fake_llm(calls))
+    result = await rag_service._answer_from_results(
+        "What is the weight?", [{"text": "Weight: 42,000 lbs", "score": 0.8}]
+    )
+    assert result["guardrail_status"] == "extracted"
+    assert result["answer"] == "42,000 lbs"
+    assert calls == []
+
+
+async def test_weak_retrieval_falls_back_to_llm(monkeypatch):
+    calls = []
+    monkeypatch.setattr(rag_service, "run_upstream", _fake_llm(calls))
+    result = await rag_service._answer_from_results(
+        "What is the weight?", [{"text": "Weight: 42,000 lbs", "score": 0.4}]
+    )
+    assert result["answer"] == "from llm"
+    assert len(calls) == 1
+
+
+async def test_near_miss_question_goes_to_llm(monkeypatch):
+    calls = []
+    monkeypatch.setattr(rag_service, "run_upstream", _fake_llm(calls))
+    result = await rag_service._answer_from_results(
+        "What is the carrier MC number?",
+        [{"text": "Carrier: FastTrucks Inc   MC Number: 123456", "score": 0.8}],
+    )
+    assert result["answer"] == "from llm"
+    assert len(calls) == 1
+
+
+async def test_large_batch_does_not_time_out_in_upstream_queue(monkeypatch):
+    import time
+
+    import numpy as np
+
+    from app.services import scheduler
+
+    # Scaled down: 0.1 s LLM calls, 4 slots, 0.3 s queue deadline, 20 questions
+    monkeypatch.setattr(scheduler, "_scheduler", scheduler.UpstreamScheduler())
+    monkeypatch.setitem(scheduler.UPSTREAM_QUEUE_DEADLINES, "interactive", 0.3)
+    monkeypatch.setattr(rag_service, "embed_queries", lambda qs: np.zeros((len(qs), 4), dtype=np.float32))
+    monkeypatch.setattr(
+        rag_service,
+        "search_similar_chunks_batch",
+        lambda doc_id, qs, k, emb: [[{"text": "Some context", "score": 0.8}] for _ in qs],
+    )
+
+    calls = []
+
+    def slow_llm(system_prompt, user_prompt, max_tokens=1024):
+        calls.append(user_prompt)
+        time.sleep(0.1)
+        return _batch_reply(user_prompt)
+
+    monkeypatch.setattr(rag_service, "_call_llm", slow_llm)
+
+    questions = [f"Question {i}?" for i in range(20)]
+    results = await rag_service.ask_questions_batch("doc", questions)
+    assert [r["guardrail_status"] for r in results] == ["grounded"] * 20
+    assert len(calls) == 20 // rag_service.BATCH_PROMPT_QUESTIONS
+
+
+def _fake_question_llm(monkeypatch, calls: list):
+    from types import SimpleNamespace
+
+    async def run_upstream(priority, fn, *args, **kwargs):
+        calls.append(kwargs)
+        content = "What is the weight?\nWho is the carrier?"
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+    monkeypatch.setattr(rag_service, "run_upstream", run_upstream)
+    monkeypatch.setattr(rag_service, "get_hf_client", lambda: SimpleNamespace(chat_completion=None))
+    monkeypatch.setattr(rag_service, "get_full_text", lambda document_id: "Weight: 42,000 lbs")
+
+
+async def test_suggested_questions_are_not_stored_while_indexing(monkeypatch):
+    stored = {}
+    calls = []
+    _fake_question_llm(monkeypatch, calls)
+    monkeypatch.setattr(rag_service, "load_document_artifact", lambda d, name: stored.get(name))
+    monkeypatch.setattr(rag_service, "save_document_artifact", lambda d, name, data: stored.__setitem__(name, data))
+
+    monkeypatch.setattr(rag_service, "get_document_status", lambda document_id: "indexing")
+    await rag_service.generate_suggested_questions("doc")
+    assert stored == {}
+
+    monkeypatch.setattr(rag_service, "get_document_status", lambda document_id: "ready")
+    await rag_service.generate_suggested_questions("doc")
+    assert stored["suggested_questions.json"] == ["What is the weight?", "Who is the carrier?"]
+    await rag_service.generate_suggested_questions("doc")
+    assert len(calls) == 2  # Third call served from storage
+
+
+def _patch_batch_retrieval(monkeypatch):
+    import numpy as np
+
+    monkeypatch.setattr(rag_service, "embed_queries", lambda qs: np.zeros((len(qs), 4), dtype=np.float32))
+    monkeypatch.setattr(
+        rag_service,
+        "search_similar_chunks_batch",
+        lambda doc_id, qs, k, emb: [[{"text": "Some context", "score": 0.8}] for _ in qs],
+    )
+
+
+def _fake_batch_llm(monkeypatch, prompts: list, reply):
+    """Route LLM calls through reply(user_prompt), recording each prompt."""
+    async def run_upstream(priority, fn, *args, **kwargs):
+        if fn is not rag_service._call_llm:
+            return fn(*args, **kwargs)
+        prompts.append(args[1])
+        return reply(args[1])
+
+    monkeypatch.setattr(rag_service, "run_upstream", run_upstream)
+
+
+async def test_batch_questions_share_one_combined_prompt(monkeypatch):
+    _patch_batch_retrieval(monkeypatch)
+    prompts = []
+    _fake_batch_llm(monkeypatch, prompts, _batch_reply)
+
+    results = await rag_service.ask_questions_batch("doc", ["one?", "two?", "three?"])
+
+    assert len(prompts) == 1
+    assert prompts[0].count("Some context") == 1  # Shared chunk listed once
+    assert [r["answer"] for r in results] == ["answer 1", "answer 2", "answer 3"]
+
+
+async def test_question_missing_from_combined_reply_is_asked_alone(monkeypatch):
+    _patch_batch_retrieval(monkeypatch)
+    prompts = []
+
+    def reply(user_prompt):
+        if "QUESTIONS:" in user_prompt:
+            return _batch_reply(user_prompt, skip=(2,))
+        return json.dumps({"answer": "alone", "confidence": 0.9})
+
+    _fake_batch_llm(monkeypatch, prompts, reply)
+    results = await rag_service.ask_questions_batch("doc", ["one?", "two?", "three?"])
+
+    assert [r["answer"] for r in results] == ["answer 1", "alone", "answer 3"]
+    assert len(prompts) == 2 and "QUESTION: two?" in prompts[1]
+
+
+async def test_unparseable_combined_reply_falls_back_per_question(monkeypatch):
+    _patch_batch_retrieval(monkeypatch)
+    prompts = []
+
+    def reply(user_prompt):
+        if "QUESTIONS:" in user_prompt:
+            return "Sorry, here are the answers: ..."
+        return json.dumps({"answer": "alone", "confidence": 0.9})
+
+    _fake_batch_llm(monkeypatch, prompts, reply)
+    results = await rag_service.ask_questions_batch("doc", ["one?", "two?"])
+
+    assert [r["answer"] for r in results] == ["alone", "alone"]
+    assert len(prompts) == 3
+
+
+async def test_failing_question_does_not_fail_the_batch(monkeypatch):
+    _patch_batch_retrieval(monkeypatch)
+    prompts = []
+
+    def reply(user_prompt):
+        if "QUESTIONS:" in user_prompt:
+            return _batch_reply(user_prompt, skip=(2,))
+        raise RuntimeError("upstream error")
+
+    _fake_batch_llm(monkeypatch, prompts, reply)
+    results = await rag_service.ask_questions_batch("doc", ["good one?", "bad one?", "good two?"])
+
+    assert [r["guardrail_status"] for r in results] == ["grounded", "error", "grounded"]
+    assert results[0]["answer"] == "answer 1" and results[2]["answer"] == "answer 3"
+
+
+async def test_batch_fully_rejected_by_scheduler_raises_overloaded(monkeypatch):
+    import pytest
+
+    from app.services.scheduler import UpstreamOverloaded
+
+    _patch_batch_retrieval(monkeypatch)
+
+    async def run_upstream(priority, fn, *args, **kwargs):
+        if fn is rag_service._call_llm:
+            raise UpstreamOverloaded("busy", retry_after=3)
+        return fn(*args, **kwargs)
+
+    monkeypatch.setattr(rag_service, "run_upstream", run_upstream)
+    with pytest.raises(UpstreamOverloaded):
+        await rag_service.ask_questions_batch("doc", ["one?", "two?"])
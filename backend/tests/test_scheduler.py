@@ -0,0 +1,157 @@
+"""Tests for the upstream scheduler: slots, priorities, deadlines and hand-back."""
+
+import asyncio
+import threading
+
+import pytest
+
+from app.services import scheduler
+from app.services.scheduler import Priority, UpstreamOverloaded, UpstreamScheduler
+
+
+@pytest.fixture
+def one_slot(monkeypatch):
+    """A scheduler with a single slot that never grows."""
+    monkeypatch.setattr(scheduler, "UPSTREAM_MAX_CONCURRENCY", 1)
+    sched = UpstreamScheduler()
+    sched._limit = 1.0
+    return sched
+
+
+def _blocking_call():
+    """A blocking fn plus the event that releases it."""
+    release = threading.Event()
+    return release, lambda value=None: (release.wait(5), value)[1]
+
+
+async def _wait_until(condition, timeout: float = 2.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not condition():
+        assert asyncio.get_running_loop().time() < deadline, "condition not reached"
+        await asyncio.sleep(0.005)
+
+
+async def test_waiters_are_served_by_priority_then_arrival(one_slot):
+    release, blocking = _blocking_call()
+    holder = asyncio.create_task(one_slot.run(Priority.INTERACTIVE, blocking))
+    await _wait_until(lambda: one_slot._active == 1)
+
+    order = []
+
+    async def queued(priority, name):
+        await one_slot.run(priority, order.append, name)
+
+    tasks = [
+        asyncio.create_task(queued(Priority.BACKGROUND, "background")),
+        asyncio.create_task(queued(Priority.UPLOAD, "upload-1")),
+        asyncio.create_task(queued(Priority.INTERACTIVE, "interactive")),
+        asyncio.create_task(queued(Priority.UPLOAD, "upload-2")),
+    ]
+    await _wait_until(lambda: sum(one_slot._queued.values()) == 4)
+
+    release.set()
+    await asyncio.gather(holder, *tasks)
+    assert order == ["interactive", "upload-1", "upload-2", "background"]
+    assert one_slot._active == 0
+
+
+async def test_queue_deadline_raises_overloaded_and_frees_the_queue(one_slot, monkeypatch):
+    monkeypatch.setitem(scheduler.UPSTREAM_QUEUE_DEADLINES, "upload", 0.05)
+    release, blocking = _blocking_call()
+    holder = asyncio.create_task(one_slot.run(Priority.INTERACTIVE, blocking))
+    await _wait_until(lambda: one_slot._active == 1)
+
+    with pytest.raises(UpstreamOverloaded) as excinfo:
+        await one_slot.run(Priority.UPLOAD, lambda: None)
+    assert excinfo.value.status_code == 503
+    assert excinfo.value.retry_after >= 1
+    assert one_slot._queued[Priority.UPLOAD] == 0
+
+    release.set()
+    await holder
+    # The timed-out waiter did not leak a slot
+    assert one_slot._active == 0
+    assert await one_slot.run(Priority.UPLOAD, lambda: "ok") == "ok"
+
+
+async def test_full_queue_rejects_immediately(one_slot, monkeypatch):
+    monkeypatch.setitem(scheduler.UPSTREAM_QUEUE_LIMITS, "background", 1)
+    release, blocking = _blocking_call()
+    holder = asyncio.create_task(one_slot.run(Priority.INTERACTIVE, blocking))
+    await _wait_until(lambda: one_slot._active == 1)
+
+    waiting = asyncio.create_task(one_slot.run(Priority.BACKGROUND, lambda: "queued"))
+    await _wait_until(lambda: one_slot._queued[Priority.BACKGROUND] == 1)
+    with pytest.raises(UpstreamOverloaded):
+        await one_slot.run(Priority.BACKGROUND, lambda: None)
+    assert one_slot.stats()["priorities"]["background"]["rejected"] == 1
+
+    release.set()
+    assert await waiting == "queued"
+    await holder
+
+
+async def test_cancelled_waiter_does_not_keep_a_slot(one_slot):
+    release, blocking = _blocking_call()
+    holder = asyncio.create_task(one_slot.run(Priority.INTERACTIVE, blocking))
+    await _wait_until(lambda: one_slot._active == 1)
+
+    abandoned = asyncio.create_task(one_slot.run(Priority.INTERACTIVE, lambda: "never"))
+    await _wait_until(lambda: one_slot._queued[Priority.INTERACTIVE] == 1)
+    abandoned.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await abandoned
+
+    release.set()
+    await holder
+    assert one_slot._active == 0
+    assert await one_slot.run(Priority.INTERACTIVE, lambda: "next") == "next"
+
+
+async def test_slot_granted_just_before_cancel_is_handed_back(one_slot):
+    release, blocking = _blocking_call()
+    holder = asyncio.create_task(one_slot.run(Priority.INTERACTIVE, blocking))
+    await _wait_until(lambda: one_slot._active == 1)
+
+    granted = asyncio.create_task(one_slot.run(Priority.INTERACTIVE, lambda: "granted"))
+    follower = asyncio.create_task(one_slot.run(Priority.UPLOAD, lambda: "follower"))
+    await _wait_until(lambda: sum(one_slot._queued.values()) == 2)
+
+    # Cancel the waiter right after the freed slot is granted to it, before it can run
+    dispatch = one_slot._dispatch
+
+    def dispatch_then_cancel():
+        dispatch()
+        if one_slot._active == 1 and not granted.done():
+            granted.cancel()
+            one_slot._dispatch = dispatch
+
+    one_slot._dispatch = dispatch_then_cancel
+    release.set()
+    await holder
+    # Depending on the Python version, wait_for either raises the cancellation or
+    # (the slot being already granted) completes the call; neither may leak the slot
+    outcome = await asyncio.gather(granted, return_exceptions=True)
+    assert isinstance(outcome[0], asyncio.CancelledError) or outcome[0] == "granted"
+
+    # The slot went to the next waiter instead of leaking
+    assert await follower == "follower"
+    assert one_slot._active == 0
+
+
+async def test_rate_limit_halves_the_limit_and_returns_429(monkeypatch):
+    sched = UpstreamScheduler()
+    sched._limit = 8.0
+
+    class RateLimited(Exception):
+        response = type("Response", (), {"status_code": 429, "headers": {"Retry-After": "7"}})()
+
+    def rate_limited():
+        raise RateLimited()
+
+    with pytest.raises(UpstreamOverloaded) as excinfo:
+        await sched.run(Priority.INTERACTIVE, rate_limited)
+    assert excinfo.value.status_code == 429
+    assert excinfo.value.retry_after == 7
+    assert sched._limit == 4.0
+    assert sched._active == 0
@@ -0,0 +1,19 @@
+"""Tests for startup warmup and the readiness it reports."""
+
+from app.services import warmup
+
+
+def test_failing_key_load_does_not_block_readiness(monkeypatch):
+    from app.services import crypto_service, document_processor, hf_client
+
+    def fail():
+        raise ValueError("no key")
+
+    monkeypatch.setattr(warmup, "_status", {**warmup._status, "ready": False})
+    monkeypatch.setattr(crypto_service, "get_aes_key", fail)
+    monkeypatch.setattr(document_processor, "preload_recent_indexes", lambda limit: 0)
+    monkeypatch.setattr(hf_client, "get_hf_client", fail)  # Skip the upstream connection
+
+    status = warmup.warm_up()
+    assert status["ready"] is True
+    assert status["upstream_connected"] is False
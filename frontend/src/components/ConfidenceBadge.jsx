@@ -9,6 +9,7 @@ export default function ConfidenceBadge({ confidence, guardrailStatus }) {
 
     const statusLabels = {
         grounded: '✓ Grounded',
+        extracted: '✓ Extracted',
         low_confidence: '⚠ Low Confidence',
         no_context: '✕ No Context',
         refused: '✕ Refused',